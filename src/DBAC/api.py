@@ -42,6 +42,11 @@ class DbOperator(DBQueries, DbEFCQueries, DbDatasetOps):
         self.GRADED = {self.KINDS.rev, self.KINDS.mst, self.KINDS.eph}
         self.RES_PATH = "./src/res/"
         self.DB_PATH = "./src/res/db.csv"
+        self.DB_COLUMNAR_PATH = "./src/res/db.npz"
+        self.DB_SQLITE_PATH = "./src/res/db.sqlite"
+        self.DB_JOURNAL_PATH = "./src/res/db.journal"
+        self.DB_ALIASES_PATH = "./src/res/db_aliases.jsonl"
+        self.DB_EFC_FEATURES_PATH = "./src/res/efc_features.npz"
         self.DATA_PATH = "./data/"
         self.TMP_BACKUP_PATH = "./src/res/tmpfcs.csv"
         self.REV_DIR = "rev"
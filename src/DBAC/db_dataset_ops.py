@@ -53,6 +53,12 @@ class DbDatasetOps:
     def __init__(self):
         self.empty_df = pd.DataFrame()
         self.__AF = FileDescriptor(tmp=True, data=self.empty_df)
+        # Per Language indexes of the files, rebuilt by update_fds
+        self.__revisions: dict[str, list[FileDescriptor]] = dict()
+        self.__languages: dict[str, list[FileDescriptor]] = dict()
+        # Newest Revision per Language, valid for the db state of last_update
+        self.__newest_revisions: dict[str, tuple] = dict()
+        self.__newest_revisions_update: Optional[float] = None
 
     @property
     def active_file(self):
@@ -280,25 +286,69 @@ class DbDatasetOps:
         return _data
 
     def get_lines_count(self, fd: FileDescriptor) -> int:
+        if fd.ext in {".csv", ".txt", ".xlsx", ".xlsm"}:
+            cnt = self.get_file_meta(fd)["lines"] - 1
+        elif fd.tmp:
+            cnt = fd.data.shape[0]
+        else:
+            raise ValueError(f"Unsupported file format: {fd.ext}")
+        return cnt
+
+    def get_file_meta(self, fd: FileDescriptor) -> dict:
+        """
+        Returns the lines count and headers of the <fd> file. Cached per
+        filepath until the size or mtime of the file changes
+        """
+        stat = os.stat(fd.filepath)
+        cache: dict = config.cache.setdefault("file_meta", dict())
+        meta = cache.get(fd.filepath)
+        if meta is None or (meta["size"], meta["mtime_ns"]) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            meta = cache[fd.filepath] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                **self.__read_file_meta(fd),
+            }
+        return meta
+
+    def __read_file_meta(self, fd: FileDescriptor) -> dict:
         if fd.ext in {".csv", ".txt"}:
             with open(fd.filepath, "rb") as f:
-                cnt = (
-                    sum(
-                        buffer.count(b"\n")
-                        for buffer in iter(lambda: f.read(1024 * 1024), b"")
-                    )
-                    - 1
+                header = f.readline()
+                lines = header.count(b"\n") + sum(
+                    buffer.count(b"\n")
+                    for buffer in iter(lambda: f.read(1024 * 1024), b"")
                 )
+            try:
+                sep = self.get_sep(fd.filepath)
+            except (IndexError, csv.Error):
+                sep = ","  # Too short to sniff the dialect
+            headers = next(
+                csv.reader([header.decode("utf-8").rstrip("\r\n")], delimiter=sep),
+                list(),
+            )
         elif fd.ext in {".xlsx", ".xlsm"}:
             workbook = openpyxl.load_workbook(
                 fd.filepath, read_only=True, data_only=True
             )
-            cnt = workbook.active.max_row - 1
-        elif fd.tmp:
-            cnt = fd.data.shape[0]
+            lines = workbook.active.max_row
+            headers = [
+                str(v)
+                for v in next(
+                    workbook.active.iter_rows(max_row=1, max_col=2, values_only=True),
+                    (),
+                )
+            ]
+            workbook.close()
         else:
             raise ValueError(f"Unsupported file format: {fd.ext}")
-        return cnt
+        return {"lines": lines, "headers": headers}
+
+    def get_cards_count(self, fds: list[FileDescriptor]) -> int:
+        """Total number of cards in the <fds> files"""
+        return sum(self.get_lines_count(fd) for fd in fds)
 
     def activate_tmp_file(
         self,
@@ -345,15 +395,16 @@ class DbDatasetOps:
             file_path,
             encoding="utf-8",
             dtype=defaultdict(lambda: str, __oid="int"),
-            sep=(
-                self.get_dialect(file_path)
-                if translate(str(config["csv_sniffer"]))
-                else ","
-            ),
+            sep=self.get_sep(file_path),
             index_col=False,
         )
         return dataset
 
+    def get_sep(self, file_path) -> str:
+        if translate(str(config["csv_sniffer"])):
+            return self.get_dialect(file_path)
+        return ","
+
     def get_dialect(self, dataset_path, investigate_rows=10):
         data = list()
         with open(dataset_path, "r", encoding="utf-8") as csvfile:
@@ -389,6 +440,16 @@ class DbDatasetOps:
             self.__update_files(lng, self.REV_DIR, kind=self.KINDS.rev)
             self.__update_files(lng, self.LNG_DIR, kind=self.KINDS.lng)
             self.__update_files(lng, self.MST_DIR, kind=self.KINDS.mst)
+        if file_meta := config.cache.get("file_meta"):
+            for filepath in file_meta.keys() - self.files.keys():
+                del file_meta[filepath]
+        self.__revisions, self.__languages = defaultdict(list), defaultdict(list)
+        for fd in self.files.values():
+            if fd.kind == self.KINDS.rev:
+                self.__revisions[fd.lng].append(fd)
+            elif fd.kind == self.KINDS.lng:
+                self.__languages[fd.lng].append(fd)
+        self.__newest_revisions_update = None
         log.debug(
             f"Collected FileDescriptors for {len(self.files)} files", stacklevel=2
         )
@@ -421,6 +482,32 @@ class DbDatasetOps:
         )
         log.info(f"Created a directory tree for {lng}")
 
+    def get_language_files(self, lng: str) -> list[FileDescriptor]:
+        return self.__languages.get(lng, list())
+
+    def get_newest_revision(
+        self, lng: str
+    ) -> Optional[tuple[FileDescriptor, Optional[datetime]]]:
+        """
+        Returns the Revision of the <lng> created last and its creation date.
+        A Revision without records is the newest one, created on None
+        """
+        if self.__newest_revisions_update != self.last_update:
+            self.__newest_revisions = dict()
+            for _lng, fds in self.__revisions.items():
+                newest = None
+                for fd in fds:
+                    summary = self.get_signature_summary(fd.signature)
+                    created = summary.first_date if summary else None
+                    if newest is None or (
+                        newest[1] is not None
+                        and (created is None or created > newest[1])
+                    ):
+                        newest = (fd, created)
+                self.__newest_revisions[_lng] = newest
+            self.__newest_revisions_update = self.last_update
+        return self.__newest_revisions.get(lng)
+
     def get_sorted_revisions(self) -> list[FileDescriptor]:
         return sorted(
             [v for _, v in self.files.items() if v.kind == self.KINDS.rev],
@@ -1,93 +1,156 @@
 import pandas as pd
 import numpy as np
 import logging
-import statistics
 from cfg import config
+from DBAC.db_view import DbView
 
 log = logging.getLogger("DBA")
 
+EFC_METRICS_DTYPES = {
+    "PREV_WPM": float,
+    "TIMEDELTA_SINCE_CREATION": int,
+    "TIMEDELTA_LAST_REV": int,
+    "CUM_CNT_REVS": int,
+    "PREV_SCORE": int,
+    "FIRST_SCORE": int,
+    "DOW": int,
+    "HOUR": int,
+    "MONTH": int,
+    "STD_SCORE": float,
+    "TOTAL_TIME": float,
+    "TREND_SCORE": float,
+    "SCORE": int,
+}
+
+
+def _hours(td: pd.Series) -> pd.Series:
+    """Whole hours of a timedelta, truncated towards zero"""
+    return np.trunc(td.dt.total_seconds() / 3600).astype(int)
+
+
+def get_avg_wpsec(db: pd.DataFrame) -> float:
+    """Words per second over the records with the time spent"""
+    sec_spent = db["SEC_SPENT"].fillna(0)
+    return db["TOTAL"].sum() / sec_spent[sec_spent != 0].sum()
+
+
+def get_sec_spent(
+    db: pd.DataFrame, avg_wpsec: float = None
+) -> tuple[pd.Series, np.ndarray]:
+    """
+    Returns the time spent on the records and which of them are featurized.
+    Given the <avg_wpsec>, the missing time is estimated from the words count
+    """
+    sec_spent = db["SEC_SPENT"].fillna(0)
+    has_time = (sec_spent != 0).to_numpy(dtype=bool)
+    if avg_wpsec is not None:
+        sec_spent = sec_spent.where(
+            has_time, np.trunc(db["TOTAL"] / avg_wpsec).astype(int)
+        )
+        has_time[:] = True
+    return sec_spent, has_time
+
+
+def get_efc_metrics(
+    db: pd.DataFrame, sec_spent: pd.Series, has_time: np.ndarray
+) -> pd.DataFrame:
+    """
+    Computes the EFC metrics of each record from the preceding ones of its
+    signature. The first 2 records of each signature are left out
+    """
+    # Records missing time are neither featurized nor counted
+    df = pd.DataFrame(
+        {
+            "TIMESTAMP": db["TIMESTAMP"],
+            "SIGNATURE": db["SIGNATURE"],
+            "TOTAL": db["TOTAL"].to_numpy(dtype=np.int64),
+            "POSITIVES": db["POSITIVES"].to_numpy(dtype=np.int64),
+            "SEC_SPENT": sec_spent.to_numpy(dtype=np.int64),
+        },
+        index=db.index,
+    )[has_time]
+    df["SCORE"] = (100 * df["POSITIVES"] / df["TOTAL"]).astype(int)
+    df["SCORE_SQ"] = df["SCORE"] ** 2
+    g = df.groupby("SIGNATURE", sort=False, observed=True)
+    cnt = g.cumcount() + 1
+    df["SECOND_SCORE"] = df["SCORE"].where(cnt == 2)
+    prev = g[["TIMESTAMP", "TOTAL", "POSITIVES", "SEC_SPENT", "SCORE"]].shift(1)
+    first = g[["TIMESTAMP", "SCORE"]].transform("first")
+    second_score = g["SECOND_SCORE"].transform("first")
+    cum = g[["SCORE", "SCORE_SQ", "SEC_SPENT"]].cumsum()
+
+    # Skip initial repetitions
+    is_rep = (cnt > 2).to_numpy()
+    df, prev, first, cum = df[is_rep], prev[is_rep], first[is_rep], cum[is_rep]
+    second_score, cnt = second_score[is_rep], cnt[is_rep]
+    ts = df["TIMESTAMP"]
+    # Population variance of the scores so far, from exact integer sums
+    var = (cnt * cum["SCORE_SQ"] - cum["SCORE"] ** 2) / cnt**2
+    # Sum of the 3-point moving averages - all but the 2 first and 2 last
+    # scores appear in 3 windows
+    trend_num = (
+        3 * cum["SCORE"]
+        - 2 * first["SCORE"]
+        - second_score
+        - prev["SCORE"]
+        - 2 * df["SCORE"]
+    )
+    return pd.DataFrame(
+        {
+            "PREV_WPM": np.round(60 * prev["TOTAL"] / prev["SEC_SPENT"], 0),
+            "TIMEDELTA_SINCE_CREATION": _hours(ts - first["TIMESTAMP"]),
+            "TIMEDELTA_LAST_REV": _hours(ts - prev["TIMESTAMP"]),
+            "CUM_CNT_REVS": cnt,
+            "PREV_SCORE": 100 * (prev["POSITIVES"] / prev["TOTAL"]),
+            "FIRST_SCORE": first["SCORE"],
+            "DOW": ts.dt.weekday,
+            "HOUR": ts.dt.hour,
+            "MONTH": ts.dt.month,
+            "STD_SCORE": np.sqrt(var),
+            "TOTAL_TIME": cum["SEC_SPENT"],
+            "TREND_SCORE": trend_num / (3 * (cnt - 2)),
+            "SCORE": df["SCORE"],
+        },
+        index=df.index,
+    ).astype(EFC_METRICS_DTYPES)
+
 
 class DbEFCQueries:
     def filter_for_efc_model(self, lngs: list = None):
         # Remove mistakes, obsolete lngs and first revs
-        self.db = self.db[self.db["LNG"].isin(lngs or config["languages"])]
+        lngs = lngs or config["languages"]
+        res = self.query_sqlite(
+            f"WHERE LNG IN ({', '.join('?' * len(lngs))}) AND KIND = ? AND IS_FIRST = 0",
+            (*lngs, self.KINDS.rev),
+        )
+        if res is not None:
+            self.db = res
+            self.filters["EFC_MODEL"] = True
+            return
+        self.db = self.db[self.db["LNG"].isin(lngs)]
         self.db = self.db[self.db["KIND"] == self.KINDS.rev]
         self.db = self.db.loc[self.db["IS_FIRST"] == 0]
         self.filters["EFC_MODEL"] = True
 
+    def view_for_efc_model(self, lngs: list = None) -> DbView:
+        return (
+            self.view()
+            .where_in("LNG", lngs or config["languages"])
+            .where_eq("KIND", self.KINDS.rev)
+            .where_not_first()
+        )
+
     def add_efc_metrics(self, fill_timespent=False):
         """expands db with efc metrics"""
-        self.db["TIMESTAMP"] = pd.to_datetime(
-            self.db["TIMESTAMP"], format=self.TSFORMAT
+        db = self.db
+        db["TIMESTAMP"] = pd.to_datetime(db["TIMESTAMP"], format=self.TSFORMAT)
+        sec_spent, has_time = get_sec_spent(
+            db, get_avg_wpsec(db) if fill_timespent else None
         )
-
-        sig = {k: list() for k in self.db["SIGNATURE"].unique()}
         if fill_timespent:
-            avg_wpsec = (
-                self.db["TOTAL"].sum()
-                / self.db.loc[self.db["SEC_SPENT"] > 0]["SEC_SPENT"].sum()
-            )
-        else:
-            avg_wpsec = 0
-        rows_to_del = list()
-        self.db["PREV_WPM"] = float(0)
-        self.db["TIMEDELTA_SINCE_CREATION"] = 0
-        self.db["TIMEDELTA_LAST_REV"] = 0
-        self.db["CUM_CNT_REVS"] = 0
-        self.db["PREV_SCORE"] = 0
-        self.db["FIRST_SCORE"] = 0
-        self.db["DOW"] = 0
-        self.db["HOUR"] = 0
-        self.db["MONTH"] = 0
-        self.db["STD_SCORE"] = float(0)
-        self.db["TOTAL_TIME"] = float(0)
-        self.db["TREND_SCORE"] = float(0)
-        self.db["SCORE"] = 0
-
-        for i, r in self.db.iterrows():
-            s = r["SIGNATURE"]
-            # Tackle missing sec_spent
-            if r["SEC_SPENT"] == 0:
-                if fill_timespent:
-                    self.db.loc[i, "SEC_SPENT"] = int(r["TOTAL"] / avg_wpsec)
-                    r["SEC_SPENT"] = int(r["TOTAL"] / avg_wpsec)
-                else:
-                    rows_to_del.append(i)
-                    continue
-            sig[s].append((r["TIMESTAMP"], r["TOTAL"], r["POSITIVES"], r["SEC_SPENT"]))
-            # Skip initial repetitions
-            if len(sig[s]) <= 2:
-                rows_to_del.append(i)
-                continue
-            # '-2' denotes previous revision
-            self.db.loc[i, "PREV_WPM"] = round(60 * sig[s][-2][1] / sig[s][-2][3], 0)
-            self.db.loc[i, "CUM_CNT_REVS"] = len(sig[s])
-            self.db.loc[i, "TIMEDELTA_LAST_REV"] = int(
-                (sig[s][-1][0] - sig[s][-2][0]).total_seconds() / 3600
-            )
-            self.db.loc[i, "TIMEDELTA_SINCE_CREATION"] = int(
-                (sig[s][-1][0] - sig[s][0][0]).total_seconds() / 3600
-            )
-            self.db.loc[i, "PREV_SCORE"] = int(100 * (sig[s][-2][2] / sig[s][-2][1]))
-
-            self.db.loc[i, "FIRST_SCORE"] = int(100 * sig[s][0][2] / sig[s][0][1])
-            self.db.loc[i, "DOW"] = sig[s][-1][0].weekday()
-            self.db.loc[i, "HOUR"] = sig[s][-1][0].hour
-            self.db.loc[i, "MONTH"] = sig[s][-1][0].month
-            self.db.loc[i, "STD_SCORE"] = statistics.pstdev(
-                [int(100 * x[2] / x[1]) for x in sig[s]]
-            )
-            self.db.loc[i, "TOTAL_TIME"] = sum(x[3] for x in sig[s])
-            self.db.loc[i, "TREND_SCORE"] = np.mean(
-                np.convolve(
-                    [int(100 * x[2] / x[1]) for x in sig[s]],
-                    np.ones(3) / 3,
-                    mode="valid",
-                )
-            )
-            self.db.loc[i, "SCORE"] = int(100 * sig[s][-1][2] / sig[s][-1][1])
-
-        self.db = self.db.drop(index=rows_to_del, axis=0)
+            db["SEC_SPENT"] = sec_spent.astype(db["SEC_SPENT"].dtype)
+        metrics = get_efc_metrics(db, sec_spent, has_time)
+        self.db = pd.concat([db.loc[metrics.index], metrics], axis=1)
         self.filters["EFC_MODEL"] = True
 
     def remove_cols_for_efc_model(self, drop_lng=False):
@@ -98,13 +161,19 @@ class DbEFCQueries:
         self.db = self.db.apply(pd.to_numeric, errors="ignore")
         self.filters["EFC_MODEL"] = True
 
-    def gather_efc_record_data(self) -> dict:
+    def gather_efc_record_data(self, view: DbView = None) -> dict:
         # Create a dictionary, mapping signatures to tuples of all matching revs
-        self.db["TIMESTAMP"] = pd.to_datetime(
-            self.db["TIMESTAMP"], format=self.TSFORMAT
-        )
-        sig = {k: list() for k in self.db["SIGNATURE"].unique()}
-        for i, r in self.db.iterrows():
+        if view is None:
+            self.db["TIMESTAMP"] = pd.to_datetime(
+                self.db["TIMESTAMP"], format=self.TSFORMAT
+            )
+            db = self.db
+        else:
+            db = view.frame(
+                ["TIMESTAMP", "SIGNATURE", "TOTAL", "POSITIVES", "SEC_SPENT", "LNG"]
+            )
+        sig = {k: list() for k in db["SIGNATURE"].unique()}
+        for i, r in db.iterrows():
             sig[r["SIGNATURE"]].append(
                 (r["TIMESTAMP"], r["TOTAL"], r["POSITIVES"], r["SEC_SPENT"], r["LNG"])
             )
@@ -112,6 +181,6 @@ class DbEFCQueries:
 
     def encode_language_columns(self, lngs: list):
         for v in lngs[:-1]:  # Avoid correlated features
-            self.db[v] = self.db["LNG"].apply(lambda r: 1 if r == v else 0)
+            self.db[v] = (self.db["LNG"] == v).astype(int)
         self.db = self.db.drop(["LNG"], axis=1)
         self.filters["EFC_MODEL"] = True
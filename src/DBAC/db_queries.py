@@ -1,17 +1,57 @@
 import pandas as pd
+import os
+import io
+import json
 import logging
+import threading
 from datetime import datetime, timedelta
 from time import time, perf_counter
 from csv import DictWriter
-from int import fcc_queue, LogLvl
-from logtools import audit_log
+from typing import Optional
+from int import fcc_queue, LogLvl, sched, Task
+from logtools import audit_log, audit_log_compact
 from data_types import StatChartDataRaw, C, adlt
+from DBAC.storage import (
+    compact_dtypes,
+    save_columnar,
+    load_columnar,
+    concat_compact,
+    rename_category,
+    apply_alias,
+    SqliteStore,
+    CATEGORICAL_COLS,
+    COUNTER_DTYPES,
+)
+from DBAC.db_view import DbView
+from DBAC.db_efc import get_avg_wpsec, get_sec_spent, get_efc_metrics
+from DBAC.db_summary import (
+    SignatureSummary,
+    build_summaries,
+    update_summary,
+    merge_summaries,
+)
+from DBAC.efc_features import (
+    EfcFeatures,
+    build_efc_features,
+    update_efc_features,
+    merge_efc_features,
+    is_efc_record,
+    save_efc_features,
+    load_efc_features,
+)
+from cfg import config
 
 log = logging.getLogger("DBA")
 
 
 class DBQueries:
     def __init__(self):
+        self.__db = pd.DataFrame()
+        self.__pending: list[dict] = list()
+        self.__unflushed: list[dict] = list()
+        self.__aliases: list[tuple[int, str, str]] = list()
+        self.__aliases_applied = 0
+        self.__write_lock = threading.Lock()
         self.db = pd.DataFrame()
         self.filters = dict(
             NOT_FIRST=False,
@@ -21,6 +61,16 @@ class DBQueries:
             PROGRESS=False,
         )
         self.__last_update = -1.0
+        self.__sig_index: dict[str, list[int]] = dict()
+        self.__summaries: dict[str, SignatureSummary] = dict()
+        self.__efc_features: dict[str, EfcFeatures] = dict()
+        self.__efc_features_source: dict = None
+        self.__db_stat: tuple = None
+        self.__db_offset = 0
+        self.__db_sentinel = b""
+        self.__columnar_stat: tuple = None
+        self.__sqlite: SqliteStore = None
+        self.__sqlite_version: int = None
         self.DEFAULT_DATE = datetime(1900, 1, 1)
 
     def __set_last_update(self):
@@ -31,30 +81,382 @@ class DBQueries:
     def last_update(self) -> float:
         return self.__last_update
 
+    @property
+    def db(self) -> pd.DataFrame:
+        """Working copy of the db, subject to the filter_* methods"""
+        if self.__pending:
+            self.__merge_pending()
+        return self.__working_db
+
+    @db.setter
+    def db(self, value: pd.DataFrame):
+        self.__working_db = value
+
+    def __merge_pending(self):
+        """Appends records created since the last merge to the db"""
+        pending, self.__pending = self.__pending, list()
+        start = len(self.__db)
+        self.__db = concat_compact(
+            self.__db, pd.DataFrame(pending, columns=self.DB_COLS)
+        )
+        for i, record in enumerate(pending, start=start):
+            self.__index_record(record, i)
+        if not any(self.filters.values()):
+            self.__working_db = self.__db.copy(deep=False)
+
     def load(self):
+        """
+        Parses the db file. If the file was only appended to since the last
+        parse, then just the new rows are read - otherwise does a full load.
+        With the 'npy' engine, cold start begins from the columnar dump.
+        With the 'sqlite' engine, records are read from the SQLite file
+        """
         t0 = perf_counter()
-        self.__db = pd.read_csv(
-            self.DB_PATH,
+        self.flush()
+        self.__replay_journal()
+        self.__load_aliases()
+        if config["db"]["engine"] == "sqlite":
+            mode = self.__load_sqlite()
+        else:
+            mode = self.__load_csv()
+        self.__reset_filters_flags()
+        self.db = self.__db.copy(deep=False)
+        self.__set_last_update()
+        log.debug(
+            f"Loaded database {mode} in {1000*(perf_counter()-t0):.3f}ms", stacklevel=3
+        )
+        if mode == "fully":
+            self.dump_columnar()
+
+    def __load_csv(self) -> str:
+        if not self.__db_stat and config["db"]["engine"] == "npy":
+            self.__load_columnar()
+        with open(self.DB_PATH, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if self.__is_appended(f, stat):
+                if self.__pending:
+                    self.__merge_pending()
+                if self.__aliases_applied < len(self.__aliases):
+                    self.__db = self.__apply_aliases(
+                        self.__db, start=self.__aliases_applied
+                    )
+                    self.__aliases_applied = len(self.__aliases)
+                    self.__build_indexes()
+                f.seek(self.__db_offset)
+                chunk = f.read()
+                chunk = chunk[: chunk.rfind(b"\n") + 1]
+                self.__append_tail(chunk)
+                self.__db_offset += len(chunk)
+                self.__db_sentinel = (self.__db_sentinel + chunk)[-256:]
+                mode = "incrementally"
+            else:
+                data = f.read()
+                self.__pending.clear()
+                self.__db = self.__apply_aliases(self.__read_db(io.BytesIO(data)))
+                self.__aliases_applied = len(self.__aliases)
+                self.__build_indexes()
+                self.__db_offset = len(data)
+                self.__db_sentinel = data[-256:]
+                mode = "fully"
+        self.__db_stat = self.__get_stat_key(stat)
+        return mode
+
+    def __load_sqlite(self) -> str:
+        if not self.__sqlite:
+            self.__open_sqlite()
+        if not self.__sqlite.count():
+            self.__load_csv()
+            self.__clear_aliases()
+            self.__sqlite.import_frame(self.__db)
+            log.info(f"Imported {self.DB_PATH} into {self.DB_SQLITE_PATH}")
+        else:
+            self.__pending.clear()
+            self.__db = self.__sqlite.read().reset_index(drop=True)
+            self.__build_indexes()
+        self.__sqlite_version = self.__sqlite.data_version()
+        return "from sqlite"
+
+    def __open_sqlite(self):
+        self.__sqlite = SqliteStore(self.DB_SQLITE_PATH, self.DB_COLS, self.TSFORMAT)
+
+    def __load_columnar(self):
+        try:
+            self.__db, source = load_columnar(self.DB_COLUMNAR_PATH)
+        except FileNotFoundError:
+            log.info(f"Columnar database not found: {self.DB_COLUMNAR_PATH}")
+            return
+        except Exception as e:
+            log.warning(f"Failed to load the columnar database: {e}", exc_info=True)
+            return
+        self.__db_offset = source["offset"]
+        self.__db_sentinel = bytes.fromhex(source["sentinel"])
+        self.__db_stat = tuple(source["stat"])
+        self.__columnar_stat = self.__db_stat
+        self.__aliases_applied = source.get("aliases", 0)
+        self.__build_indexes()
+
+    def dump_columnar(self):
+        """Saves the db in the columnar format if the 'npy' engine is active"""
+        if config["db"]["engine"] != "npy" or self.__columnar_stat == self.__db_stat:
+            return
+        elif self.__unflushed:
+            return
+        elif self.__pending:
+            self.__merge_pending()
+        t0 = perf_counter()
+        save_columnar(
+            self.DB_COLUMNAR_PATH,
+            self.__db,
+            source={
+                "offset": self.__db_offset,
+                "sentinel": self.__db_sentinel.hex(),
+                "stat": self.__db_stat,
+                "aliases": self.__aliases_applied,
+            },
+        )
+        self.__columnar_stat = self.__db_stat
+        log.debug(
+            f"Saved columnar database in {1000*(perf_counter()-t0):.3f}ms", stacklevel=2
+        )
+
+    def set_engine(self, engine: str):
+        """
+        Switches the storage engine. db.csv is maintained by the 'csv' and 'npy'
+        engines - 'sqlite' imports it and exports it back when switched off
+        """
+        if engine not in {"csv", "npy", "sqlite"}:
+            raise ValueError(f"Unknown database engine: {engine}")
+        self.flush()
+        if self.__is_db_file_modified():
+            self.load()
+        elif self.__pending:
+            self.__merge_pending()
+        if self.__sqlite and engine != "sqlite":
+            self.__sqlite.export_csv(self.DB_PATH)
+            self.__clear_aliases()
+            self.__sqlite.close()
+            self.__sqlite = None
+            self.__save_db_file_state()
+        elif engine == "sqlite" and not self.__sqlite:
+            self.__open_sqlite()
+            self.__sqlite.import_frame(self.__db)
+            self.__sqlite_version = self.__sqlite.data_version()
+        config["db"]["engine"] = engine
+        if engine == "npy":
+            self.__columnar_stat = None
+            self.dump_columnar()
+        elif os.path.exists(self.DB_COLUMNAR_PATH):
+            os.remove(self.DB_COLUMNAR_PATH)
+        log.info(f"Switched database engine to {engine}")
+
+    def flush(self):
+        """Writes buffered records to db.csv and drops the journal"""
+        if not self.__unflushed:
+            return
+        t0 = perf_counter()
+        with self.__write_lock:
+            is_modified = self.__is_db_file_modified()
+            with open(self.DB_PATH, "ab") as f:
+                f.write(self.__serialize_records(self.__unflushed))
+                f.flush()
+                os.fsync(f.fileno())
+            if is_modified:
+                # Buffered rows are re-read with the external changes
+                self.__db_stat = None
+            else:
+                self.__save_db_file_state()
+        cnt = len(self.__unflushed)
+        self.__unflushed.clear()
+        self.__remove_journal()
+        log.debug(
+            f"Flushed {cnt} records in {1000*(perf_counter()-t0):.3f}ms", stacklevel=2
+        )
+
+    def __serialize_records(self, records: list[dict]) -> bytes:
+        buffer = io.StringIO()
+        DictWriter(buffer, fieldnames=self.DB_COLS, delimiter=";").writerows(records)
+        return buffer.getvalue().encode("utf-8")
+
+    def __write_journal(self, record: dict):
+        """
+        Keeps buffered records in a journal that survives a crash.
+        The header holds the db.csv offset the records are going to be written at
+        """
+        with open(self.DB_JOURNAL_PATH, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write(json.dumps({"offset": self.__db_offset}) + "\n")
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+
+    def __replay_journal(self):
+        """
+        Writes records left in the journal after an unclean exit to db.csv.
+        Records already present at the expected offset are not duplicated
+        """
+        try:
+            with open(self.DB_JOURNAL_PATH, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        records = list()
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                log.warning(f"Skipped a malformed journal entry: {line}")
+        if records:
+            offset = json.loads(lines[0])["offset"]
+            payload = self.__serialize_records(records)
+            with open(self.DB_PATH, "rb+") as f:
+                f.seek(offset)
+                written = f.read(len(payload))
+                if written == payload:
+                    pass
+                elif payload.startswith(written):
+                    f.seek(offset)
+                    f.truncate()
+                    f.write(payload)
+                else:
+                    f.seek(0, os.SEEK_END)
+                    f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self.__db_stat = None
+            log.info(f"Recovered {len(records)} records from the journal")
+        self.__remove_journal()
+
+    def __remove_journal(self):
+        try:
+            os.remove(self.DB_JOURNAL_PATH)
+        except FileNotFoundError:
+            pass
+
+    def __load_aliases(self):
+        """Reads the renames that are yet to be compacted into db.csv"""
+        try:
+            with open(self.DB_ALIASES_PATH, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            lines = list()
+        aliases = list()
+        for line in lines:
+            try:
+                r = json.loads(line)
+                aliases.append((r["rows"], r["old"], r["new"]))
+            except (json.JSONDecodeError, KeyError, ValueError):
+                log.warning(f"Skipped a malformed alias: {line}")
+        if len(aliases) < self.__aliases_applied:
+            # Compacted by another instance
+            self.__db_stat = None
+        self.__aliases = aliases
+
+    def __apply_aliases(
+        self, df: pd.DataFrame, start: int = 0, offset: int = 0
+    ) -> pd.DataFrame:
+        """Applies aliases from <start> to the <df> beginning at row <offset>"""
+        for rows, old, new in self.__aliases[start:]:
+            df = apply_alias(df, old, new, end=rows, start=offset)
+        return df
+
+    def __clear_aliases(self):
+        self.__aliases = list()
+        self.__aliases_applied = 0
+        try:
+            os.remove(self.DB_ALIASES_PATH)
+        except FileNotFoundError:
+            pass
+
+    def compact_aliases(self):
+        """
+        Rewrites db.csv with the aliases applied and clears the alias journal.
+        Gives up if the db gets modified in the meantime
+        """
+        with self.__write_lock:
+            if (
+                not self.__aliases
+                or self.__sqlite
+                or self.__aliases_applied < len(self.__aliases)
+                or self.__is_db_file_modified()
+            ):
+                return
+            db, stat = self.__db, self.__db_stat
+        audit_log_compact()
+        t0 = perf_counter()
+        tmp_path = f"{self.DB_PATH}.tmp"
+        db.to_csv(
+            tmp_path, encoding="utf-8", sep=";", index=False, date_format=self.TSFORMAT
+        )
+        with self.__write_lock:
+            if self.__db is not db or self.__is_db_file_modified():
+                os.remove(tmp_path)
+                log.debug("Database changed during the compaction. Aborted")
+                return
+            os.replace(tmp_path, self.DB_PATH)
+            self.__save_db_file_state()
+            self.__clear_aliases()
+        log.debug(
+            f"Compacted aliases into the database in {1000*(perf_counter()-t0):.0f}ms"
+        )
+
+    def __read_db(self, src, **kwargs) -> pd.DataFrame:
+        # Parsing straight into the compact dtypes is several times slower
+        return pd.read_csv(
+            src,
             encoding="utf-8",
             sep=";",
             parse_dates=["TIMESTAMP"],
             date_format=self.TSFORMAT,
-            dtype={
-                "TOTAL": "Int64",
-                "POSITIVES": "Int64",
-                "SEC_SPENT": "Int64",
-                "IS_FIRST": "Int64",
-            },
-        )
-        self.db = self.__db.copy(deep=True)
-        self.__set_last_update()
-        log.debug(f"Loaded database in {1000*(perf_counter()-t0):.3f}ms", stacklevel=3)
+            **kwargs,
+        ).pipe(compact_dtypes)
+
+    def __append_tail(self, chunk: bytes):
+        if not chunk:
+            return
+        tail = self.__read_db(io.BytesIO(chunk), header=None, names=self.DB_COLS)
+        start = len(self.__db)
+        tail = self.__apply_aliases(tail, offset=start)
+        self.__db = concat_compact(self.__db, tail)
+        for i, record in enumerate(tail.to_dict("records"), start=start):
+            self.__index_record(record, i)
+
+    def __is_appended(self, f, stat: os.stat_result) -> bool:
+        """Checks if the file is the one parsed last time, extended at the end"""
+        if not self.__db_stat or self.__db_stat[:2] != (stat.st_dev, stat.st_ino):
+            return False
+        elif stat.st_size < self.__db_offset:
+            return False
+        f.seek(self.__db_offset - len(self.__db_sentinel))
+        return f.read(len(self.__db_sentinel)) == self.__db_sentinel
+
+    def __get_stat_key(self, stat: os.stat_result) -> tuple:
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def __is_db_file_modified(self) -> bool:
+        if self.__sqlite:
+            return self.__sqlite.data_version() != self.__sqlite_version
+        return self.__get_stat_key(os.stat(self.DB_PATH)) != self.__db_stat
+
+    def __save_db_file_state(self):
+        """Marks the current content of the db file as already loaded"""
+        with open(self.DB_PATH, "rb") as f:
+            stat = os.fstat(f.fileno())
+            f.seek(max(0, stat.st_size - 256))
+            self.__db_sentinel = f.read()
+        self.__db_offset = stat.st_size
+        self.__db_stat = self.__get_stat_key(stat)
+
+    @property
+    def __active_db_path(self) -> str:
+        return self.DB_SQLITE_PATH if self.__sqlite else self.DB_PATH
 
     def refresh(self) -> bool:
-        if any(self.filters.values()):
+        if self.__is_db_file_modified():
+            self.load()
+            return True
+        elif any(self.filters.values()):
             t0 = perf_counter()
             self.__reset_filters_flags()
-            self.db = self.__db.copy(deep=True)
+            self.db = self.__db.copy(deep=False)
             log.debug(
                 f"Refreshed database in {1000*(perf_counter()-t0):.3f}ms", stacklevel=3
             )
@@ -65,8 +467,162 @@ class DBQueries:
         for key in self.filters.keys():
             self.filters[key] = False
 
+    def __build_indexes(self):
+        """Maps each signature to the positions of its rows and their summary"""
+        self.__summaries = build_summaries(self.__db)
+        if not self.__restore_efc_features():
+            self.__efc_features = build_efc_features(self.__db, self.KINDS.rev)
+        self.__sig_index = {
+            k: v.tolist()
+            for k, v in self.__db.groupby(
+                "SIGNATURE", sort=False, observed=True
+            ).indices.items()
+        }
+
+    def query_sqlite(self, where: str, params: tuple = ()) -> pd.DataFrame | None:
+        """
+        Runs an indexed query against the 'sqlite' engine. Returns None if the
+        engine is not active or the result would not match the working db
+        """
+        if (
+            not self.__sqlite
+            or any(self.filters.values())
+            or self.__is_db_file_modified()
+        ):
+            return None
+        return self.__sqlite.read(where, params)
+
+    def __index_record(self, record: dict, pos: int):
+        self.__sig_index.setdefault(record["SIGNATURE"], []).append(pos)
+        update_summary(self.__summaries, record, pos)
+        if is_efc_record(record, self.KINDS.rev):
+            update_efc_features(self.__efc_features, record, pos)
+
+    def __get_efc_features_source(self) -> dict:
+        return {
+            "rows": len(self.__db),
+            "aliases": self.__aliases_applied,
+            "last": (
+                self.__db["TIMESTAMP"].iloc[-1].strftime(self.TSFORMAT)
+                if len(self.__db)
+                else None
+            ),
+        }
+
+    def __restore_efc_features(self) -> bool:
+        """On a cold start, reuses the EFC features persisted for the same db"""
+        if self.__efc_features_source is not None:
+            return False
+        self.__efc_features_source = dict()
+        try:
+            features, source = load_efc_features(self.DB_EFC_FEATURES_PATH)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            log.warning(f"Failed to load the EFC features: {e}", exc_info=True)
+            return False
+        if source != self.__get_efc_features_source():
+            log.debug("Persisted EFC features are outdated")
+            return False
+        self.__efc_features = features
+        self.__efc_features_source = source
+        log.debug(f"Restored EFC features of {len(features)} signatures")
+        return True
+
+    def dump_efc_features(self):
+        """Persists the EFC features next to the db, unless nothing changed"""
+        if self.__pending:
+            self.__merge_pending()
+        source = self.__get_efc_features_source()
+        if source == self.__efc_features_source:
+            return
+        t0 = perf_counter()
+        save_efc_features(self.DB_EFC_FEATURES_PATH, self.__efc_features, source)
+        self.__efc_features_source = source
+        log.debug(
+            f"Saved EFC features in {1000*(perf_counter()-t0):.3f}ms", stacklevel=2
+        )
+
+    def get_efc_features(self, lngs: list = None) -> dict[str, EfcFeatures]:
+        """
+        Returns running aggregates over the EFC model records of each signature,
+        limited to the <lngs> (active Languages by default). Ignores filters
+        """
+        if self.__pending:
+            self.__merge_pending()
+        lngs = set(lngs or config["languages"])
+        return {k: v for k, v in self.__efc_features.items() if v.lng in lngs}
+
+    def get_efc_sample(self, signature: str) -> Optional[tuple[str, list, int]]:
+        """
+        Returns the Language, the EFC model input of the latest EFC record of
+        the <signature> and the score of that record, featurized as for the
+        training. None if the record is not among the training ones
+        """
+        if self.__pending:
+            self.__merge_pending()
+        rows = self.__db.iloc[self.__sig_index.get(signature, [])]
+        rows = rows[
+            ((rows["KIND"] == self.KINDS.rev) & (rows["IS_FIRST"] == 0))
+            .fillna(False)
+            .to_numpy()
+        ]
+        if len(rows) < 3:
+            return None
+        avg_wpsec = None
+        if (rows["SEC_SPENT"].fillna(0) == 0).any():
+            # Estimated from all the records, as for the training
+            avg_wpsec = get_avg_wpsec(
+                self.view_for_efc_model().frame(["TOTAL", "SEC_SPENT"])
+            )
+        metrics = get_efc_metrics(rows, *get_sec_spent(rows, avg_wpsec))
+        if metrics.empty or metrics.index[-1] != rows.index[-1]:
+            return None
+        last = metrics.iloc[-1]
+        # TOTAL followed by the metrics, in the order of the model input
+        return (
+            rows["LNG"].iloc[-1],
+            [int(rows["TOTAL"].iloc[-1])] + last.drop("SCORE").tolist(),
+            int(last["SCORE"]),
+        )
+
+    def get_signature_summary(self, signature: str) -> Optional[SignatureSummary]:
+        """Returns aggregates over all records of the <signature>. Ignores filters"""
+        if self.__pending:
+            self.__merge_pending()
+        return self.__summaries.get(signature)
+
+    def __use_summary(self, signature) -> bool:
+        return signature is not None and not any(self.filters.values())
+
+    def view(self) -> DbView:
+        """
+        Returns an immutable view over the current state of the db.
+        Unlike the filter_* methods, it doesn't touch the shared working db
+        """
+        if self.__pending:
+            self.__merge_pending()
+        return DbView(self.__db, self.__sig_index)
+
+    def view_for_progress(self, lngs: set) -> DbView:
+        return (
+            self.view()
+            .where_eq("KIND", self.KINDS.rev)
+            .where_in("LNG", lngs)
+            .where_not_first()
+        )
+
+    def get_signature_rows(self, signature: str) -> pd.DataFrame:
+        """Returns rows for the <signature>. Uses the index unless filters are active"""
+        if any(self.filters.values()):
+            return self.db[self.db["SIGNATURE"] == signature]
+        return self.db.iloc[self.__sig_index.get(signature, [])]
+
     def create_record(self, words_total, positives, seconds_spent, is_first):
-        """Appends a new record to the db for the active file"""
+        """
+        Appends a new record to the db for the active file. The record is merged
+        into the frame lazily and written to db.csv as per the flush policy
+        """
         ts = datetime.now()
         record = {
             "TIMESTAMP": ts.strftime(self.TSFORMAT),
@@ -78,11 +634,22 @@ class DBQueries:
             "KIND": self.active_file.kind,
             "IS_FIRST": is_first,
         }
-        with open(self.DB_PATH, "a") as fd:
-            dw = DictWriter(fd, fieldnames=self.DB_COLS, delimiter=";")
-            dw.writerow(record)
-        self.__db.loc[len(self.__db)] = {**record, "TIMESTAMP": ts}
-        self.db = self.__db.copy(deep=True)
+        if self.__is_db_file_modified():
+            self.load()
+        if self.__sqlite:
+            self.__sqlite.insert(record)
+        elif config["db"]["flush_policy"] == "immediate":
+            self.__unflushed.append(record)
+            self.flush()
+        else:
+            self.__write_journal(record)
+            self.__unflushed.append(record)
+            if (
+                config["db"]["flush_policy"] == "batched"
+                and len(self.__unflushed) >= config["db"]["flush_batch_size"]
+            ):
+                self.flush()
+        self.__pending.append({**record, "TIMESTAMP": ts})
         self.__set_last_update()
         fcc_queue.put_notification(
             f"Recorded {self.active_file.signature}", lvl=LogLvl.important
@@ -90,30 +657,84 @@ class DBQueries:
         audit_log(
             op=adlt.op.add,
             data=record,
-            filepath=self.DB_PATH,
+            filepath=self.__active_db_path,
             author=adlt.author.dbq,
-            row=len(self.__db) - 1,
+            row=len(self.__db) + len(self.__pending) - 1,
         )
 
     def rename_signature(self, old: str, new: str):
-        self.__db["SIGNATURE"] = self.__db["SIGNATURE"].replace(old, new, regex=False)
-        self.__db.to_csv(
-            self.DB_PATH,
-            encoding="utf-8",
-            sep=";",
-            index=False,
-            date_format=self.TSFORMAT,
-        )
-        self.db = self.__db.copy(deep=True)
+        if self.__is_db_file_modified():
+            self.load()
+        elif self.__pending:
+            self.__merge_pending()
+        db = self.__db.copy(deep=False)
+        db["SIGNATURE"] = rename_category(db["SIGNATURE"], old, new)
+        self.__db = db
+        if old in self.__sig_index:
+            sig_index = self.__sig_index.copy()
+            sig_index[new] = sorted(sig_index.get(new, []) + sig_index.pop(old))
+            self.__sig_index = sig_index
+        if old in self.__summaries:
+            summaries = self.__summaries.copy()
+            s = summaries.pop(old)
+            summaries[new] = merge_summaries(summaries[new], s) if new in summaries else s
+            self.__summaries = summaries
+        if old in self.__efc_features:
+            features = self.__efc_features.copy()
+            f = features.pop(old)
+            features[new] = (
+                merge_efc_features(features[new], f) if new in features else f
+            )
+            self.__efc_features = features
+        if self.__sqlite:
+            self.__sqlite.rename(old, new)
+        else:
+            self.__add_alias(old, new)
+        self.db = self.__db.copy(deep=False)
         self.__set_last_update()
         audit_log(
             op=adlt.op.rename,
             data=[old, new],
-            filepath=self.DB_PATH,
+            filepath=self.__active_db_path,
             author=adlt.author.dbq,
             row=":",
         )
 
+    def __add_alias(self, old: str, new: str):
+        """
+        Records the rename in the alias journal instead of rewriting db.csv.
+        The alias applies to rows preceding it, as db.csv is append-only
+        """
+        self.flush()
+        alias = {
+            "ts": datetime.now().strftime(self.TSFORMAT),
+            "rows": len(self.__db),
+            "old": old,
+            "new": new,
+        }
+        with open(self.DB_ALIASES_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(alias) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.__aliases.append((alias["rows"], old, new))
+        self.__aliases_applied = len(self.__aliases)
+        if len(self.__aliases) >= config["db"]["aliases_compaction_threshold"]:
+            sched.run_task(Task([self.compact_aliases], op_id="compact_aliases"))
+
+    def get_memory_usage(self) -> dict[str, tuple[int, int]]:
+        """Returns bytes used per column: (with object/Int64 dtypes, as loaded)"""
+        if self.__pending:
+            self.__merge_pending()
+        loose = self.__db.astype(
+            {
+                **{col: object for col in CATEGORICAL_COLS},
+                **{col: "Int64" for col in COUNTER_DTYPES},
+            }
+        )
+        before = loose.memory_usage(deep=True, index=False)
+        after = self.__db.memory_usage(deep=True, index=False)
+        return {col: (int(before[col]), int(after[col])) for col in self.__db.columns}
+
     def get_unique_signatures(self):
         return self.db["SIGNATURE"].drop_duplicates(inplace=False)
 
@@ -123,10 +744,16 @@ class DBQueries:
         )
 
     def get_sum_repeated(self, signature) -> int:
-        cnt = self.db[self.db["SIGNATURE"] == signature].shape[0] - 1
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            return summary.count - 1 if summary else -1
+        cnt = self.get_signature_rows(signature).shape[0] - 1
         return int(cnt)
 
     def get_total_time_spent_for_signature(self, signature=None):
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            return summary.sum_sec_spent if summary else 0
         time_spent = self.get_filtered_db_if("SIGNATURE", signature)
         time_spent = time_spent["SEC_SPENT"].sum()
         time_spent = time_spent if time_spent is not None else 0
@@ -144,10 +771,19 @@ class DBQueries:
         # returns filtered db if condtion is not None
         if condition is None:
             return self.db
+        elif col == "SIGNATURE":
+            return self.get_signature_rows(condition)
         else:
             return self.db[self.db[col] == condition]
 
     def get_last_positives(self, signature=None, req_not_first=False) -> int:
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            if not summary:
+                return 0
+            elif req_not_first and summary.last_nf_pos >= 0:
+                return summary.last_nf_positives or 0
+            return summary.last_positives or 0
         try:
             res = self.get_filtered_db_if("SIGNATURE", signature)
             if req_not_first:
@@ -159,6 +795,13 @@ class DBQueries:
             return 0
 
     def get_last_time_spent(self, signature=None, req_not_first=False) -> int:
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            if not summary:
+                return 0
+            elif req_not_first and summary.last_nf_pos >= 0:
+                return summary.last_nf_sec_spent or 0
+            return summary.last_sec_spent or 0
         try:
             res = self.get_filtered_db_if("SIGNATURE", signature)
             if req_not_first:
@@ -170,6 +813,9 @@ class DBQueries:
             return 0
 
     def get_total_words(self, signature=None) -> int:
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            return (summary.last_total or 0) if summary else 0
         try:
             res = self.get_filtered_db_if("SIGNATURE", signature)
             return int(res["TOTAL"].iloc[-1])
@@ -177,6 +823,9 @@ class DBQueries:
             return 0
 
     def get_max_positives_count(self, signature=None) -> int:
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            return (summary.max_positives or 0) if summary else 0
         try:
             positives_list = self.get_filtered_db_if("SIGNATURE", signature)
             positives_list = positives_list["POSITIVES"]
@@ -185,14 +834,20 @@ class DBQueries:
             return 0
 
     def get_first_datetime(self, signature) -> datetime:
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            return summary.first_date if summary else self.DEFAULT_DATE
         try:
-            return self.db[self.db["SIGNATURE"] == signature].iloc[0]["TIMESTAMP"]
+            return self.get_signature_rows(signature)["TIMESTAMP"].iloc[0]
         except IndexError:
             return self.DEFAULT_DATE
 
     def get_last_datetime(self, signature) -> datetime:
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            return summary.last_date if summary else self.DEFAULT_DATE
         try:
-            return self.db[self.db["SIGNATURE"] == signature].iloc[-1]["TIMESTAMP"]
+            return self.get_signature_rows(signature)["TIMESTAMP"].iloc[-1]
         except IndexError:
             return self.DEFAULT_DATE
 
@@ -219,21 +874,36 @@ class DBQueries:
             return timedelta(0)
 
     def get_count_of_records_missing_time(self, signature=None) -> int:
+        if self.__use_summary(signature):
+            summary = self.get_signature_summary(signature)
+            return summary.missing_time_cnt if summary else 0
         res = self.get_filtered_db_if("SIGNATURE", signature)
-        return res[self.db["SEC_SPENT"] == 0].shape[0]
+        return res[res["SEC_SPENT"] == 0].shape[0]
 
     def get_stat_chart_data(self, signature: str) -> StatChartDataRaw:
-        db = self.db.loc[self.db["SIGNATURE"] == signature].copy(deep=True)
-        sum_repeated = int(db.shape[0])
-        sum_sec_spent = db[C.sec_spent].sum()
-        missing_records_cnt = db[db[C.sec_spent] == 0].shape[0]
-        total_cards = db.iloc[-1][C.total]
-        creation_date = db.iloc[0][C.timestamp]
-        last_rev_date = db.iloc[-1][C.timestamp]
+        db = self.get_signature_rows(signature)[
+            [C.timestamp, C.total, C.positives, C.sec_spent]
+        ]
+        if self.__use_summary(signature) and (
+            summary := self.get_signature_summary(signature)
+        ):
+            sum_repeated = summary.count
+            sum_sec_spent = summary.sum_sec_spent
+            missing_records_cnt = summary.missing_time_cnt
+            total_cards = summary.last_total
+            creation_date = summary.first_date
+            last_rev_date = summary.last_date
+        else:
+            sum_repeated = int(db.shape[0])
+            sum_sec_spent = db[C.sec_spent].sum()
+            missing_records_cnt = db[db[C.sec_spent] == 0].shape[0]
+            total_cards = db.iloc[-1][C.total]
+            creation_date = db.iloc[0][C.timestamp]
+            last_rev_date = db.iloc[-1][C.timestamp]
 
         if db.iloc[0][C.positives] == 0:
             # Remove first Revision if ungraded
-            db.drop(db.index[0], inplace=True)
+            db = db.iloc[1:]
 
         sec_spent = db[C.sec_spent].values.tolist()
         positives = db[C.positives].values.tolist()
@@ -286,19 +956,23 @@ class DBQueries:
         self.db = self.db[
             (self.db["KIND"] == self.KINDS.rev)
             & (self.db["LNG"].isin(lngs))
-            & (~self.db["IS_FIRST"])
+            & (self.db["IS_FIRST"] == 0)
         ]
         self.filters["PROGRESS"] = True
 
-    def get_avg_cpm(self, default=0) -> float:
-        if div := self.db["SEC_SPENT"].sum():
-            return self.db["TOTAL"].sum() / (div / 60)
+    def get_avg_cpm(self, default=0, view: DbView = None) -> float:
+        if view is None:
+            view = DbView(self.db, dict())
+        if div := view.sum("SEC_SPENT"):
+            return view.sum("TOTAL") / (div / 60)
         else:
             return default
 
-    def get_avg_score(self, default=0) -> float:
-        if div := self.db["TOTAL"].sum():
-            return self.db["POSITIVES"].sum() / div
+    def get_avg_score(self, default=0, view: DbView = None) -> float:
+        if view is None:
+            view = DbView(self.db, dict())
+        if div := view.sum("TOTAL"):
+            return view.sum("POSITIVES") / div
         else:
             return default
 
@@ -309,6 +983,12 @@ class DBQueries:
         return self.db["LNG"].drop_duplicates(inplace=False).values.tolist()
 
     def get_cards_total(self, signatures: list) -> int:
+        if not any(self.filters.values()):
+            return sum(
+                summary.last_total or 0
+                for sig in set(signatures)
+                if (summary := self.get_signature_summary(sig))
+            )
         db = self.db.drop_duplicates(subset="SIGNATURE", keep="last")
         return int(db[db["SIGNATURE"].isin(signatures)]["TOTAL"].sum())
 
@@ -321,6 +1001,15 @@ class DBQueries:
         }
 
     def get_seconds_spent_today(self, lng: str) -> int:
+        if self.__sqlite and not any(self.filters.values()):
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            return int(
+                self.__sqlite.sum_seconds_spent(
+                    lng,
+                    today.strftime(self.TSFORMAT),
+                    (today + timedelta(days=1)).strftime(self.TSFORMAT),
+                )
+            )
         today = datetime.now().date()
         filtered = self.db[
             (self.db["TIMESTAMP"].dt.date == today) & (self.db["LNG"] == lng)
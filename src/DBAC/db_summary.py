@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class SignatureSummary:
+    count: int
+    first_pos: int
+    first_date: pd.Timestamp
+    last_pos: int
+    last_date: pd.Timestamp
+    last_total: Optional[int]
+    last_positives: Optional[int]
+    last_sec_spent: Optional[int]
+    max_positives: Optional[int]
+    sum_sec_spent: int
+    missing_time_cnt: int
+    # Latest record that is not the first revision
+    last_nf_pos: int = -1
+    last_nf_positives: Optional[int] = None
+    last_nf_sec_spent: Optional[int] = None
+
+
+def _opt_int(value) -> Optional[int]:
+    return None if pd.isna(value) else int(value)
+
+
+def _to_list(sr: pd.Series) -> list[Optional[int]]:
+    return [None if pd.isna(v) else int(v) for v in sr.to_numpy(dtype=object)]
+
+
+def _opt_max(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    if a is None or b is None:
+        return b if a is None else a
+    return max(a, b)
+
+
+def build_summaries(df: pd.DataFrame) -> dict[str, SignatureSummary]:
+    """Aggregates the db per signature"""
+    if df.empty:
+        return dict()
+    pos = pd.Series(np.arange(len(df)), index=df.index)
+    sec_spent = df["SEC_SPENT"]
+    is_nf = (df["IS_FIRST"] == 0).fillna(False)
+    g = pos.groupby(df["SIGNATURE"], sort=False, observed=True)
+    agg = pd.DataFrame(
+        {
+            "count": g.size(),
+            "first_pos": g.min(),
+            "last_pos": g.max(),
+            "max_positives": df["POSITIVES"]
+            .groupby(df["SIGNATURE"], sort=False, observed=True)
+            .max(),
+            "sum_sec_spent": sec_spent.groupby(
+                df["SIGNATURE"], sort=False, observed=True
+            ).sum(),
+            "missing_time_cnt": (sec_spent == 0)
+            .fillna(False)
+            .groupby(df["SIGNATURE"], sort=False, observed=True)
+            .sum(),
+            "last_nf_pos": pos[is_nf]
+            .groupby(df["SIGNATURE"][is_nf], sort=False, observed=True)
+            .max(),
+        }
+    )
+    agg["last_nf_pos"] = agg["last_nf_pos"].fillna(-1).astype(int)
+    first = agg["first_pos"].to_numpy()
+    last = agg["last_pos"].to_numpy()
+    nf = agg["last_nf_pos"].to_numpy()
+    has_nf = nf >= 0
+    last_nf_positives = _to_list(df["POSITIVES"].take(nf.clip(min=0)))
+    last_nf_sec_spent = _to_list(df["SEC_SPENT"].take(nf.clip(min=0)))
+    summaries = dict()
+    for sig, *values in zip(
+        agg.index,
+        agg["count"].tolist(),
+        first.tolist(),
+        df["TIMESTAMP"].take(first),
+        last.tolist(),
+        df["TIMESTAMP"].take(last),
+        _to_list(df["TOTAL"].take(last)),
+        _to_list(df["POSITIVES"].take(last)),
+        _to_list(df["SEC_SPENT"].take(last)),
+        _to_list(agg["max_positives"]),
+        agg["sum_sec_spent"].astype(int).tolist(),
+        agg["missing_time_cnt"].astype(int).tolist(),
+        nf.tolist(),
+        [v if h else None for v, h in zip(last_nf_positives, has_nf)],
+        [v if h else None for v, h in zip(last_nf_sec_spent, has_nf)],
+    ):
+        summaries[sig] = SignatureSummary(*values)
+    return summaries
+
+
+def update_summary(
+    summaries: dict[str, SignatureSummary], record: dict, pos: int
+) -> None:
+    """Accounts for a <record> appended at <pos>"""
+    positives = _opt_int(record["POSITIVES"])
+    sec_spent = _opt_int(record["SEC_SPENT"])
+    ts = pd.Timestamp(record["TIMESTAMP"])
+    s = summaries.get(record["SIGNATURE"])
+    if s is None:
+        s = summaries[record["SIGNATURE"]] = SignatureSummary(
+            count=0,
+            first_pos=pos,
+            first_date=ts,
+            last_pos=pos,
+            last_date=ts,
+            last_total=None,
+            last_positives=None,
+            last_sec_spent=None,
+            max_positives=None,
+            sum_sec_spent=0,
+            missing_time_cnt=0,
+        )
+    s.count += 1
+    s.last_pos = pos
+    s.last_date = ts
+    s.last_total = _opt_int(record["TOTAL"])
+    s.last_positives = positives
+    s.last_sec_spent = sec_spent
+    s.max_positives = _opt_max(s.max_positives, positives)
+    s.sum_sec_spent += sec_spent or 0
+    s.missing_time_cnt += sec_spent == 0
+    if _opt_int(record["IS_FIRST"]) == 0:
+        s.last_nf_pos = pos
+        s.last_nf_positives = positives
+        s.last_nf_sec_spent = sec_spent
+
+
+def merge_summaries(a: SignatureSummary, b: SignatureSummary) -> SignatureSummary:
+    """Combines summaries of two signatures renamed to one"""
+    first = a if a.first_pos < b.first_pos else b
+    last = a if a.last_pos > b.last_pos else b
+    nf = a if a.last_nf_pos > b.last_nf_pos else b
+    return SignatureSummary(
+        count=a.count + b.count,
+        first_pos=first.first_pos,
+        first_date=first.first_date,
+        last_pos=last.last_pos,
+        last_date=last.last_date,
+        last_total=last.last_total,
+        last_positives=last.last_positives,
+        last_sec_spent=last.last_sec_spent,
+        max_positives=_opt_max(a.max_positives, b.max_positives),
+        sum_sec_spent=a.sum_sec_spent + b.sum_sec_spent,
+        missing_time_cnt=a.missing_time_cnt + b.missing_time_cnt,
+        last_nf_pos=nf.last_nf_pos,
+        last_nf_positives=nf.last_nf_positives,
+        last_nf_sec_spent=nf.last_nf_sec_spent,
+    )
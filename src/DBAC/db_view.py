@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from bisect import bisect_left
+
+
+class DbView:
+    """
+    Immutable query over a snapshot of the db. Filters compose lazily as
+    row masks over the base frame, which is never modified in place, and
+    only the requested columns are materialized. A view of a signature keeps
+    the positions of its rows instead, so that its filters only visit those
+    """
+
+    __slots__ = ("_base", "_sig_index", "_mask", "_rows")
+
+    def __init__(
+        self,
+        base: pd.DataFrame,
+        sig_index: dict[str, list[int]],
+        mask: np.ndarray = None,
+        rows: np.ndarray = None,
+    ):
+        self._base = base
+        self._sig_index = sig_index
+        self._mask = mask
+        self._rows = rows
+
+    def __len__(self) -> int:
+        if self._rows is not None:
+            return len(self._rows)
+        elif self._mask is None:
+            return len(self._base)
+        return int(np.count_nonzero(self._mask))
+
+    def where(self, mask) -> "DbView":
+        """Returns a new view narrowed down by a boolean <mask> over the base"""
+        if isinstance(mask, pd.Series):
+            mask = mask.to_numpy(dtype=bool, na_value=False)
+        if self._rows is not None:
+            return self._narrow(mask[self._rows])
+        elif self._mask is not None:
+            mask = self._mask & mask
+        return DbView(self._base, self._sig_index, mask)
+
+    def _narrow(self, mask) -> "DbView":
+        """Keeps the rows of a signature view where the <mask> over them is set"""
+        if isinstance(mask, pd.Series):
+            mask = mask.to_numpy(dtype=bool, na_value=False)
+        return DbView(self._base, self._sig_index, rows=self._rows[mask])
+
+    def where_eq(self, col: str, value) -> "DbView":
+        if self._rows is not None:
+            return self._narrow(self.column(col) == value)
+        return self.where(self._base[col] == value)
+
+    def where_in(self, col: str, values) -> "DbView":
+        if self._rows is not None:
+            return self._narrow(self.column(col).isin(values))
+        return self.where(self._base[col].isin(values))
+
+    def where_lng(self, lngs) -> "DbView":
+        if not lngs:
+            return self
+        elif not isinstance(lngs, (set, list, tuple)):
+            lngs = {lngs}
+        return self.where_in("LNG", lngs)
+
+    def where_not_first(self) -> "DbView":
+        return self.where_eq("IS_FIRST", 0)
+
+    def where_signature(self, signature: str) -> "DbView":
+        """Takes the positions of its rows from the signature index"""
+        rows = self._sig_index.get(signature, [])
+        rows = np.array(rows[: bisect_left(rows, len(self._base))], dtype=np.int64)
+        if self._rows is not None:
+            rows = np.intersect1d(self._rows, rows, assume_unique=True)
+        elif self._mask is not None:
+            rows = rows[self._mask[rows]]
+        return DbView(self._base, self._sig_index, rows=rows)
+
+    def column(self, col: str) -> pd.Series:
+        if self._rows is not None:
+            return self._base[col].iloc[self._rows]
+        elif self._mask is None:
+            return self._base[col]
+        return self._base[col][self._mask]
+
+    def frame(self, cols: list = None) -> pd.DataFrame:
+        """Materializes the view. Returns a copy that can be freely modified"""
+        cols = list(cols) if cols is not None else self._base.columns
+        if self._rows is not None:
+            return self._base[cols].iloc[self._rows]
+        elif self._mask is None:
+            return self._base[cols].copy()
+        return self._base.loc[self._mask, cols]
+
+    def sum(self, col: str):
+        return self.column(col).sum()
@@ -0,0 +1,275 @@
+import os
+import json
+import math
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from dataclasses import dataclass, field, fields
+
+EFC_FEATURES_VERSION = 1
+_COLUMNS = {
+    "lng": str,
+    "cnt": np.int64,
+    "first_score": np.int64,
+    "last_total": np.int64,
+    "last_positives": np.int64,
+    "last_sec_spent": np.int64,
+    "total_time": np.int64,
+    "score_sum": np.int64,
+    "ratio_mean": np.float64,
+    "ratio_m2": np.float64,
+}
+
+
+@dataclass
+class EfcFeatures:
+    """
+    Running aggregates over the revisions of a signature, from which the
+    EFC model input is derived. Only the 2 first and 2 last scores are kept
+    as (position, score) - enough for the mean of 3-point moving averages
+    """
+
+    lng: str
+    cnt: int
+    first_date: datetime
+    first_score: int
+    last_date: datetime
+    last_total: int
+    last_positives: int
+    last_sec_spent: int
+    total_time: int
+    score_sum: int
+    head_scores: list[tuple[int, int]] = field(default_factory=list)
+    tail_scores: list[tuple[int, int]] = field(default_factory=list)
+    # Welford's running mean and sum of squared deviations of the ratios
+    ratio_mean: float = 0.0
+    ratio_m2: float = 0.0
+
+    @property
+    def version(self) -> tuple[int, datetime]:
+        """Changes whenever a record of the signature is added or merged"""
+        return self.cnt, self.last_date
+
+    @property
+    def std_score(self) -> float:
+        return math.sqrt(self.ratio_m2 / self.cnt)
+
+    @property
+    def trend_score(self) -> float:
+        if self.cnt < 3:
+            return self.score_sum / 3
+        (_, x0), (_, x1) = self.head_scores
+        (_, y0), (_, y1) = self.tail_scores
+        return (3 * self.score_sum - 2 * x0 - x1 - y0 - 2 * y1) / (3 * (self.cnt - 2))
+
+    def to_record(self, now: datetime) -> list:
+        """Returns the EFC model input as of <now>"""
+        return [
+            self.last_total,
+            (
+                60 * self.last_total / self.last_sec_spent
+                if self.last_sec_spent != 0
+                else 0
+            ),
+            (now - self.first_date).total_seconds() / 3600,
+            (now - self.last_date).total_seconds() / 3600,
+            self.cnt,
+            int(100 * (self.last_positives / self.last_total)),
+            self.first_score,
+            now.weekday(),
+            now.hour,
+            now.month,
+            self.std_score,
+            self.total_time,
+            self.trend_score,
+        ]
+
+
+def is_efc_record(record: dict, kind: str) -> bool:
+    """Mirrors the EFC model filter, except for the Languages"""
+    return (
+        record["KIND"] == kind
+        and not pd.isna(record["IS_FIRST"])
+        and record["IS_FIRST"] == 0
+    )
+
+
+def build_efc_features(df: pd.DataFrame, kind: str) -> dict[str, EfcFeatures]:
+    """Aggregates revisions of <kind>, except for the first ones, per signature"""
+    df = df[((df["KIND"] == kind) & (df["IS_FIRST"] == 0)).fillna(False).to_numpy()]
+    if df.empty:
+        return dict()
+    total = df["TOTAL"].to_numpy(dtype=np.int64)
+    positives = df["POSITIVES"].to_numpy(dtype=np.int64)
+    data = pd.DataFrame(
+        {
+            "POS": df.index.to_numpy(dtype=np.int64),
+            "SCORE": (100 * positives / total).astype(np.int64),
+            "RATIO": (positives / total).astype(np.int64),
+            "SEC_SPENT": df["SEC_SPENT"].fillna(0).to_numpy(dtype=np.int64),
+        }
+    )
+    data["RATIO_SQ"] = data["RATIO"] ** 2
+    g = data.groupby(df["SIGNATURE"].to_numpy(), sort=False)
+    sums = g[["SCORE", "RATIO", "RATIO_SQ", "SEC_SPENT"]].sum()
+    cnt = g.size().to_numpy()
+    group = g.ngroup().to_numpy()
+    nth = g.cumcount().to_numpy()
+    nth_last = g.cumcount(ascending=False).to_numpy()
+
+    def pick(mask: np.ndarray) -> np.ndarray:
+        """Row of each group that matches the <mask>, -1 if none"""
+        rows = np.full(len(cnt), -1)
+        rows[group[mask]] = np.flatnonzero(mask)
+        return rows
+
+    head = np.stack([pick(nth == 0), pick(nth == 1)], axis=1)
+    tail = np.stack([pick(nth_last == 1), pick(nth_last == 0)], axis=1)
+    first, last = head[:, 0], tail[:, 1]
+    cols = {
+        "lng": df["LNG"].astype(object).to_numpy()[last],
+        "cnt": cnt,
+        "first_date": df["TIMESTAMP"].to_numpy()[first],
+        "first_score": (100 * (positives[first] / total[first])).astype(np.int64),
+        "last_date": df["TIMESTAMP"].to_numpy()[last],
+        "last_total": total[last],
+        "last_positives": positives[last],
+        "last_sec_spent": data["SEC_SPENT"].to_numpy()[last],
+        "total_time": sums["SEC_SPENT"].to_numpy(),
+        "score_sum": sums["SCORE"].to_numpy(),
+        "ratio_mean": sums["RATIO"].to_numpy() / cnt,
+        "ratio_m2": (
+            cnt * sums["RATIO_SQ"].to_numpy() - sums["RATIO"].to_numpy() ** 2
+        )
+        / cnt,
+    }
+    for name, idx in (("head", head), ("tail", tail)):
+        cols[f"{name}_pos"] = np.where(idx >= 0, data["POS"].to_numpy()[idx], -1)
+        cols[f"{name}_score"] = np.where(idx >= 0, data["SCORE"].to_numpy()[idx], -1)
+    return _from_columns(sums.index, cols)
+
+
+def _scores(pos: np.ndarray, score: np.ndarray) -> list[list[tuple[int, int]]]:
+    """Pairs (n, 2) positions and scores per row, skipping the -1 padding"""
+    return [
+        [(p0, s0), (p1, s1)] if p1 >= 0 else [(p0, s0)] if p0 >= 0 else []
+        for p0, p1, s0, s1 in zip(*pos.T.tolist(), *score.T.tolist())
+    ]
+
+
+def _from_columns(sigs, cols: dict[str, np.ndarray]) -> dict[str, EfcFeatures]:
+    values = {k: cols[k].tolist() for k in _COLUMNS}
+    for k in ("first_date", "last_date"):
+        values[k] = cols[k].astype("datetime64[us]").tolist()
+    for name in ("head", "tail"):
+        values[f"{name}_scores"] = _scores(cols[f"{name}_pos"], cols[f"{name}_score"])
+    order = [f.name for f in fields(EfcFeatures)]
+    return {
+        sig: EfcFeatures(*v)
+        for sig, *v in zip(sigs, *(values[k] for k in order))
+    }
+
+
+def update_efc_features(features: dict[str, EfcFeatures], record: dict, pos: int):
+    """Accounts for a revision <record> appended at <pos>"""
+    total, positives = int(record["TOTAL"]), int(record["POSITIVES"])
+    sec_spent = 0 if pd.isna(record["SEC_SPENT"]) else int(record["SEC_SPENT"])
+    ts = pd.Timestamp(record["TIMESTAMP"])
+    score = int(100 * positives / total)
+    f = features.get(record["SIGNATURE"])
+    if f is None:
+        f = features[record["SIGNATURE"]] = EfcFeatures(
+            lng=record["LNG"],
+            cnt=0,
+            first_date=ts,
+            first_score=int(100 * (positives / total)),
+            last_date=ts,
+            last_total=total,
+            last_positives=positives,
+            last_sec_spent=sec_spent,
+            total_time=0,
+            score_sum=0,
+        )
+    f.lng = record["LNG"]
+    f.cnt += 1
+    f.last_date = ts
+    f.last_total = total
+    f.last_positives = positives
+    f.last_sec_spent = sec_spent
+    f.total_time += sec_spent
+    f.score_sum += score
+    if len(f.head_scores) < 2:
+        f.head_scores.append((pos, score))
+    f.tail_scores = [*f.tail_scores[-1:], (pos, score)]
+    delta = int(positives / total) - f.ratio_mean
+    f.ratio_mean += delta / f.cnt
+    f.ratio_m2 += delta * (int(positives / total) - f.ratio_mean)
+
+
+def merge_efc_features(a: EfcFeatures, b: EfcFeatures) -> EfcFeatures:
+    """Combines features of two signatures renamed to one"""
+    first = a if a.head_scores[0] < b.head_scores[0] else b
+    last = a if a.tail_scores[-1] > b.tail_scores[-1] else b
+    cnt = a.cnt + b.cnt
+    delta = b.ratio_mean - a.ratio_mean
+    return EfcFeatures(
+        lng=last.lng,
+        cnt=cnt,
+        first_date=first.first_date,
+        first_score=first.first_score,
+        last_date=last.last_date,
+        last_total=last.last_total,
+        last_positives=last.last_positives,
+        last_sec_spent=last.last_sec_spent,
+        total_time=a.total_time + b.total_time,
+        score_sum=a.score_sum + b.score_sum,
+        head_scores=sorted(a.head_scores + b.head_scores)[:2],
+        tail_scores=sorted(a.tail_scores + b.tail_scores)[-2:],
+        ratio_mean=a.ratio_mean + delta * b.cnt / cnt,
+        ratio_m2=a.ratio_m2 + b.ratio_m2 + delta**2 * a.cnt * b.cnt / cnt,
+    )
+
+
+def save_efc_features(path: str, features: dict[str, EfcFeatures], source: dict):
+    """
+    <source> describes the state of the db covered by the <features>. Stored
+    column-wise, like the columnar db, with dates truncated to seconds
+    """
+    items = list(features.values())
+    cols = {
+        k: np.array([getattr(f, k) for f in items], dtype=dtype)
+        for k, dtype in _COLUMNS.items()
+    }
+    for k in ("first_date", "last_date"):
+        cols[k] = (
+            pd.DatetimeIndex([getattr(f, k) for f in items])
+            .to_numpy(dtype="datetime64[ns]")
+            .astype("datetime64[s]")
+        )
+    for name in ("head", "tail"):
+        scores = np.full((len(items), 2, 2), -1, dtype=np.int64)
+        for i, f in enumerate(items):
+            for j, sc in enumerate(getattr(f, f"{name}_scores")):
+                scores[i, j] = sc
+        cols[f"{name}_pos"], cols[f"{name}_score"] = scores[..., 0], scores[..., 1]
+    meta = {"version": EFC_FEATURES_VERSION, "source": source}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            signatures=np.array(list(features.keys()), dtype=str),
+            meta=np.array(json.dumps(meta)),
+            **cols,
+        )
+    os.replace(tmp_path, path)
+
+
+def load_efc_features(path: str) -> tuple[dict[str, EfcFeatures], dict]:
+    """Reads features dumped by save_efc_features. Returns them and their source"""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(data["meta"].item())
+        if meta["version"] != EFC_FEATURES_VERSION:
+            raise ValueError(f"Unsupported EFC features version: {meta['version']}")
+        cols = {k: data[k] for k in data.files if k not in {"signatures", "meta"}}
+        sigs = data["signatures"].tolist()
+    return _from_columns(sigs, cols), meta["source"]
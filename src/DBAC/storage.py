@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger("DBA")
+
+CATEGORICAL_COLS = ("SIGNATURE", "LNG", "KIND")
+COUNTER_COLS = ("TOTAL", "POSITIVES", "SEC_SPENT", "IS_FIRST")
+COUNTER_DTYPES = {
+    "TOTAL": "Int32",
+    "POSITIVES": "Int32",
+    "SEC_SPENT": "Int32",
+    "IS_FIRST": "Int8",
+}
+COLUMNAR_VERSION = 1
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Stores strings as categoricals and counters as fixed-width nullable ints"""
+    return df.astype(
+        {
+            **{col: "category" for col in CATEGORICAL_COLS},
+            **COUNTER_DTYPES,
+        }
+    )
+
+
+def concat_compact(base: pd.DataFrame, tail: pd.DataFrame) -> pd.DataFrame:
+    """
+    Appends the <tail> to the compacted <base>. New categories are added after
+    the existing ones, so the codes of already loaded rows never change
+    """
+    tail = tail.astype(COUNTER_DTYPES)
+    for col in CATEGORICAL_COLS:
+        values = tail[col].astype(object)
+        cats = base[col].cat.categories
+        new_cats = pd.Index(values.dropna().unique()).difference(cats, sort=False)
+        if len(new_cats):
+            base = base.assign(**{col: base[col].cat.add_categories(new_cats)})
+        tail[col] = pd.Categorical(values, dtype=base[col].dtype)
+    return pd.concat([base, tail], ignore_index=True)
+
+
+def rename_category(sr: pd.Series, old: str, new: str) -> pd.Series:
+    """Returns the categorical <sr> with <old> values replaced by <new>"""
+    cats = sr.cat.categories
+    if old not in cats:
+        return sr
+    elif new not in cats:
+        return sr.cat.rename_categories({old: new})
+    codes = sr.cat.codes.to_numpy(copy=True)
+    codes[codes == cats.get_loc(old)] = cats.get_loc(new)
+    return pd.Series(
+        pd.Categorical.from_codes(codes, dtype=sr.dtype), index=sr.index, name=sr.name
+    )
+
+
+def apply_alias(
+    df: pd.DataFrame, old: str, new: str, end: int, start: int = 0
+) -> pd.DataFrame:
+    """
+    Renames the <old> signature to <new> in records at positions below <end>.
+    <start> is the position of the first row of the <df> in the db
+    """
+    sr = df["SIGNATURE"]
+    cats = sr.cat.categories
+    if old not in cats or start >= end:
+        return df
+    elif start + len(df) <= end:
+        return df.assign(SIGNATURE=rename_category(sr, old, new))
+    elif new not in cats:
+        sr = sr.cat.add_categories([new])
+    codes = sr.cat.codes.to_numpy(copy=True)
+    is_old = codes[: end - start] == cats.get_loc(old)
+    codes[: end - start][is_old] = sr.cat.categories.get_loc(new)
+    return df.assign(SIGNATURE=pd.Categorical.from_codes(codes, dtype=sr.dtype))
+
+
+def save_columnar(path: str, df: pd.DataFrame, source: dict):
+    """
+    Dumps the db into an uncompressed npz file - string columns are stored
+    as categorical codes and timestamps as raw datetime64 values.
+    <source> describes the state of db.csv covered by the dump.
+    """
+    arrays = {
+        "TIMESTAMP": df["TIMESTAMP"].to_numpy(dtype="datetime64[ns]"),
+    }
+    for col in CATEGORICAL_COLS:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            codes, uniques = df[col].cat.codes.to_numpy(), df[col].cat.categories
+        else:
+            codes, uniques = pd.factorize(df[col])
+        arrays[f"{col}.codes"] = codes.astype(np.int32)
+        arrays[f"{col}.cats"] = np.asarray(uniques, dtype=str)
+    for col in COUNTER_COLS:
+        arrays[col] = df[col].to_numpy(dtype=np.int64, na_value=0)
+        arrays[f"{col}.mask"] = df[col].isna().to_numpy()
+    meta = {
+        "version": COLUMNAR_VERSION,
+        "rows": len(df),
+        "columns": list(df.columns),
+        "source": source,
+    }
+    arrays["meta"] = np.array(json.dumps(meta))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_columnar(path: str) -> tuple[pd.DataFrame, dict]:
+    """Reads a db dumped by save_columnar. Returns the db and its source state"""
+    with np.load(path, allow_pickle=False) as npz:
+        meta = json.loads(str(npz["meta"]))
+        if meta["version"] != COLUMNAR_VERSION:
+            raise ValueError(f"Unsupported columnar version: {meta['version']}")
+        data = {"TIMESTAMP": npz["TIMESTAMP"]}
+        for col in CATEGORICAL_COLS:
+            data[col] = pd.Categorical.from_codes(
+                npz[f"{col}.codes"],
+                categories=pd.Index(npz[f"{col}.cats"], dtype=object),
+            )
+        for col in COUNTER_COLS:
+            data[col] = pd.arrays.IntegerArray(
+                npz[col].astype(COUNTER_DTYPES[col].lower()), npz[f"{col}.mask"]
+            )
+    df = pd.DataFrame(data, columns=meta["columns"], copy=False)
+    if len(df) != meta["rows"]:
+        raise ValueError(f"Expected {meta['rows']} rows but got {len(df)}")
+    return df, meta["source"]
+
+
+class SqliteStore:
+    """
+    Keeps the db records in an SQLite file. Rows are never deleted, so
+    rowid-1 matches the position of a record in the loaded db
+    """
+
+    def __init__(self, path: str, cols: tuple, tsformat: str):
+        self.path = path
+        self.cols = cols
+        self.tsformat = tsformat
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.__create_schema()
+
+    def __create_schema(self):
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                TIMESTAMP TEXT NOT NULL,
+                SIGNATURE TEXT NOT NULL,
+                LNG TEXT,
+                TOTAL INTEGER,
+                POSITIVES INTEGER,
+                SEC_SPENT INTEGER,
+                KIND TEXT,
+                IS_FIRST INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS ix_sig_ts ON records (SIGNATURE, TIMESTAMP);
+            CREATE INDEX IF NOT EXISTS ix_lng_kind ON records (LNG, KIND);
+            CREATE INDEX IF NOT EXISTS ix_ts ON records (TIMESTAMP);
+            """
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def data_version(self) -> int:
+        """Changes whenever another connection commits to the file"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def read(self, where: str = "", params: tuple = ()) -> pd.DataFrame:
+        """Returns matching records indexed by their position in the db"""
+        df = pd.read_sql_query(
+            f"SELECT rowid-1 AS ROW, {', '.join(self.cols)} FROM records "
+            f"{where} ORDER BY rowid",
+            self.conn,
+            params=params,
+            index_col="ROW",
+            parse_dates={"TIMESTAMP": self.tsformat},
+            dtype={col: "Int64" for col in COUNTER_COLS},
+        )
+        df.index.name = None
+        return compact_dtypes(df)
+
+    def import_frame(self, df: pd.DataFrame):
+        """Replaces all records with the <df>"""
+        rows = df.astype(object).where(df.notna(), None)
+        rows["TIMESTAMP"] = df["TIMESTAMP"].dt.strftime(self.tsformat)
+        with self.conn:
+            self.conn.execute("DELETE FROM records")
+            self.conn.executemany(
+                f"INSERT INTO records ({', '.join(self.cols)}) "
+                f"VALUES ({', '.join('?' * len(self.cols))})",
+                rows[list(self.cols)].itertuples(index=False, name=None),
+            )
+
+    def export_csv(self, path: str):
+        self.read().to_csv(
+            path, encoding="utf-8", sep=";", index=False, date_format=self.tsformat
+        )
+
+    def insert(self, record: dict):
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO records ({', '.join(self.cols)}) "
+                f"VALUES ({', '.join('?' * len(self.cols))})",
+                tuple(record[col] for col in self.cols),
+            )
+
+    def rename(self, old: str, new: str) -> int:
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE records SET SIGNATURE = ? WHERE SIGNATURE = ?", (new, old)
+            )
+        return cur.rowcount
+
+    def sum_seconds_spent(self, lng: str, since: str, until: str) -> int:
+        return self.conn.execute(
+            "SELECT COALESCE(SUM(SEC_SPENT), 0) FROM records "
+            "WHERE LNG = ? AND TIMESTAMP >= ? AND TIMESTAMP < ?",
+            (lng, since, until),
+        ).fetchone()[0]
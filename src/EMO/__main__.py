@@ -0,0 +1,65 @@
+"""
+EFC Model Optimizer without the GUI. Trains and evaluates all the models
+on the revisions history, saves the selected one as model.pkl and writes
+the evaluation report. Run from the application directory.
+
+Usage: python src/EMO --languages EN DE --approach Universal --out emo.json
+"""
+
+import os
+import sys
+import logging
+import argparse
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    from cfg import config
+    from EMO.models import EMOApproaches
+
+    parser = argparse.ArgumentParser(prog="EMO", description=__doc__.split(".")[0])
+    parser.add_argument("--languages", nargs="+", default=config["EMO"]["languages"])
+    parser.add_argument(
+        "--approach",
+        choices=[a.value for a in EMOApproaches],
+        default=config["EMO"]["approach"],
+    )
+    parser.add_argument(
+        "--model",
+        default="auto",
+        help="Model to save. 'auto' picks the one with the highest explained variance",
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        default=not config["EMO"]["parallel_training"],
+        help="Train the models one after another in this process",
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="Only evaluate the models"
+    )
+    parser.add_argument("--out", default="emo_report.json")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+    from EMO.batch import run
+
+    return run(
+        args.languages,
+        args.approach,
+        args.model,
+        parallel=not args.sequential,
+        save=not args.no_save,
+        out=args.out,
+    )
+
+
+# Spawned worker processes import this module as __mp_main__
+if __name__ == "__main__":
+    sys.exit(main())
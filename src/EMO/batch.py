@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import logging
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Optional
+from concurrent.futures import as_completed
+from logtools import JsonEncoder
+from cfg import config
+from DBAC import db_conn
+from EMO.models import TRAINED_MODELS, train_model
+from EMO.pipeline import Pipeline
+
+log = logging.getLogger("EMO")
+
+
+class Batch(Pipeline):
+    """EFC Model Optimizer writing to the stdout instead of the FCC console"""
+
+    def __init__(self, parallel: bool):
+        super().__init__()
+        self.parallel = parallel
+        self.timings = dict()
+        self.training_errors = dict()
+        self.__line_open = False
+
+    def send_output(self, text: str, include_newline=True):
+        if include_newline and self.__line_open:
+            sys.stdout.write("\n")
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        self.__line_open = True
+
+    def prt_res(self, func, msg, *args, **kwargs):
+        t0 = perf_counter()
+        res = super().prt_res(func, msg, *args, **kwargs)
+        self.timings[msg.strip(" .")] = perf_counter() - t0
+        return res
+
+    def train(self):
+        """Trains the models on the split data, in worker processes if parallel"""
+        mc = self.models_creator
+        if not self.parallel:
+            for name in TRAINED_MODELS:
+                self.__add_trained(
+                    name,
+                    lambda: train_model(
+                        name, mc.x_train, mc.y_train, mc.x_test, mc.y_test
+                    ),
+                )
+            return
+        futures = {
+            f: name for name, f in mc.start_training(list(TRAINED_MODELS)).items()
+        }
+        for future in as_completed(futures):
+            self.__add_trained(futures[future], future.result)
+        mc.stop_training()
+
+    def __add_trained(self, name: str, get_result: Callable):
+        self.send_output(f"Training {name} model... ")
+        try:
+            self.models_creator.add_trained(name, get_result())
+        except Exception as e:
+            self.training_errors[name] = e
+            self.send_output("FAILED", include_newline=False)
+            log.error(f"Training {name} model failed: {e}", exc_info=True)
+        else:
+            self.send_output("OK", include_newline=False)
+
+    def select(self, model: str) -> Optional[str]:
+        """Picks the <model> or, if 'auto', the one explaining the most variance"""
+        evaluation = self.models_creator.evaluation
+        if model == "auto":
+            return max(evaluation, key=lambda k: evaluation[k].Explained_Variance)
+        return model.upper() if model.upper() in evaluation else None
+
+    def save(self, model: str) -> str:
+        self.prt_res(
+            self.models_creator.save_model,
+            f"Saving {model} model... ",
+            model,
+            discretizer=self.discretizer,
+            lng_cols=self.selected_lngs,
+            approach=self.selected_approach,
+        )
+        return os.path.join(db_conn.RES_PATH, "model.pkl")
+
+    def get_report(self) -> dict:
+        models = dict()
+        for name, ev in self.models_creator.evaluation.items():
+            models[name] = {
+                "explained_variance": ev.Explained_Variance,
+                "mean_absolute_error": ev.Mean_Absolute_Error,
+                "mean_tweedie_deviance": ev.Mean_Tweedie_Deviance,
+                "test_records": len(ev.Test_Data),
+                **self.models_creator.timings.get(name, dict()),
+            }
+        for name, e in self.training_errors.items():
+            models[name] = {"error": str(e)}
+        return {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "languages": self.selected_lngs,
+            "approach": self.selected_approach,
+            "parallel": self.parallel,
+            "records": len(db_conn.db),
+            "steps": self.timings,
+            "models": models,
+        }
+
+
+def run(
+    lngs: list, approach: str, model: str, parallel: bool, save: bool, out: str
+) -> int:
+    """
+    Trains and evaluates all the models, then saves the selected one as the
+    current EFC model. Returns the exit code
+    """
+    batch = Batch(parallel)
+    batch.set_emo_lngs(lngs)
+    batch.set_emo_approach(approach)
+    batch.send_output("Starting EFC Optimizer... OK")
+    batch.prepare()
+    batch.train()
+    selected = batch.select(model)
+    report = batch.get_report()
+    report["selected"] = selected
+    report["saved"] = batch.save(selected) if selected and save else None
+    # Includes loading the db, which happens on import
+    report["total_time"] = perf_counter() - config.session_start
+    with open(out, "w") as f:
+        json.dump(report, f, indent=4, cls=JsonEncoder)
+    batch.send_output(f"Saved report to {out}\n")
+    if not selected:
+        log.error(f"Model {model} is not available")
+        return 1
+    return 0
@@ -1,12 +1,12 @@
 from dataclasses import dataclass
 import logging
+from time import perf_counter
+from PyQt5.QtCore import QTimer
 from int import fcc_queue
 from utils import translate
 from cfg import config
-from DBAC import db_conn
-from EMO.models import Models, EMOApproaches
-import EMO.augmentation as augmentation
-from cfg import config
+from EMO.models import TRAINED_MODELS
+from EMO.pipeline import Pipeline
 
 log = logging.getLogger("EMO")
 
@@ -21,26 +21,18 @@ class Steps:
     decide_exit = "decide_exit"
 
 
-class CLI:
+class CLI(Pipeline):
     def __init__(self, fcc):
+        super().__init__()
         self.err_msg = ""
         self.step = None
-        self.discretizer = None
         self.fcc = fcc
-        self.__verify_discretizer()
-        self.models_creator = Models()
         self.accepted = False
-
-    def __verify_discretizer(self):
-        self.DICSRETIZERS = {
-            "yeo-johnson": augmentation.transformation_yeo_johnson,
-            "decision-tree": augmentation.decision_tree_discretizer,
-        }
-        if disc := config["EMO"].get("discretizer"):
-            if disc not in self.DICSRETIZERS.keys():
-                raise KeyError(
-                    f"Discretizer '{disc}' not in {list(self.DICSRETIZERS.keys())} "
-                )
+        # Models being trained in the background and the ones that failed
+        self.training = dict()
+        self.training_errors = dict()
+        self.training_timer = QTimer()
+        self.training_timer.timeout.connect(self._poll_training)
 
     def send_output(self, text: str, include_newline=True):
         if include_newline:
@@ -58,96 +50,53 @@ class CLI:
         self.fcc.console.setText("")
         self.fcc.console_log = []
 
-    def prt_res(self, func, msg, *args, **kwargs):
-        self.send_output(msg)
-        res = func(*args, **kwargs)
-        self.send_output("OK", include_newline=False)
-        return res
-
-    def set_emo_lngs(self, lngs: list):
-        self.selected_lngs = lngs
-        log.debug(f"Selected languages: {self.selected_lngs}")
-
-    def set_emo_approach(self, approach: str):
-        if approach not in {i.value for i in EMOApproaches}:
-            raise KeyError(f"Unknown approach: '{approach}'. ")
-        self.selected_approach = approach
-        log.debug(f"Selected approach: {self.selected_approach}")
-
     def run_emo(self):
         self.cls()
         self.send_output("Starting EFC Optimizer... OK")
-        self._prepare_data()
-        # CST model must be trained on raw data
-        self.prt_res(
-            self.models_creator.prep_CST, "Preparing CST model... ", db_conn.db
-        )
-        self.prt_res(self.models_creator.eval_CST, "Evaluating CST model... ")
-
-        self._prepare_augmentation()
+        self.prepare()
         self._prepare_models()
         self.available_models = self.models_creator.models.keys()
 
-    def _prepare_data(self):
-        self.prt_res(db_conn.refresh, "Loading data... ")
-        self.send_output("Filtering... ")
-        db_conn.filter_for_efc_model(self.selected_lngs)
-        if len(db_conn.db) >= config["EMO"]["min_records"]:
-            self.send_output("OK", include_newline=False)
-            self.send_output(f"{len(db_conn.db)} records submitted")
-        else:
-            self.send_output("FAILED", include_newline=False)
-            raise Exception(
-                f"Not enough records in database: {len(db_conn.db)}/{config['EMO']['min_records']}. "
-            )
-        self.prt_res(
-            db_conn.add_efc_metrics, "Creating metrics... ", fill_timespent=True
-        )
-        self.prt_res(
-            db_conn.remove_cols_for_efc_model,
-            "Dropping obsolete columns... ",
-            drop_lng=self.selected_approach == EMOApproaches.universal.value,
-        )
-        if self.selected_approach == EMOApproaches.language_specific.value:
-            self.prt_res(
-                db_conn.encode_language_columns,
-                "Encoding Language columns...",
-                lngs=self.selected_lngs,
-            )
-            # Rearrange columns
-            db_conn.db = db_conn.db[
-                [c for c in db_conn.db.columns if c != "SCORE"] + ["SCORE"]
-            ]
-
-    def _prepare_augmentation(self):
-        db_conn.db = self.prt_res(
-            augmentation.cap_quantiles, "Capping quantiles... ", db_conn.db
-        )
-        if discretizer := self.DICSRETIZERS[config["EMO"]["discretizer"]]:
-            db_conn.db, self.discretizer = self.prt_res(
-                discretizer,
-                f"Applying {config['EMO']['discretizer']} Discretization... ",
-                db_conn.db,
-            )
-            log.debug(f"Applied {config['EMO']['discretizer']} Discretization")
-
     def _prepare_models(self):
-        self.prt_res(
-            self.models_creator.prep_LASSO, "Preparing LASSO model... ", db_conn.db
-        )
+        if config["EMO"]["parallel_training"]:
+            self.send_output("Training models in parallel...")
+            self.training = self.models_creator.start_training(list(TRAINED_MODELS))
+            self.training_t0 = perf_counter()
+            self.training_timer.start(100)
+            return
+        self.prt_res(self.models_creator.prep_LASSO, "Preparing LASSO model... ")
         self.prt_res(self.models_creator.eval_LASSO, "Evaluating LASSO model... ")
-        self.prt_res(
-            self.models_creator.prep_SVR, "Preparing SVR model... ", db_conn.db
-        )
+        self.prt_res(self.models_creator.prep_SVR, "Preparing SVR model... ")
         self.prt_res(self.models_creator.eval_SVR, "Evaluating SVR model... ")
-        self.prt_res(
-            self.models_creator.prep_RFR, "Preparing RFR model... ", db_conn.db
-        )
+        self.prt_res(self.models_creator.prep_RFR, "Preparing RFR model... ")
         self.prt_res(self.models_creator.eval_RFR, "Evaluating RFR model... ")
-        self.prt_res(
-            self.models_creator.prep_XGB, "Preparing XGB model... ", db_conn.db
-        )
+        self.prt_res(self.models_creator.prep_XGB, "Preparing XGB model... ")
         self.prt_res(self.models_creator.eval_XGB, "Evaluating XGB model... ")
+        self.prt_res(self.models_creator.prep_SGD, "Preparing SGD model... ")
+        self.prt_res(self.models_creator.eval_SGD, "Evaluating SGD model... ")
+
+    def _poll_training(self):
+        """Adds the models trained since the last poll"""
+        done = [name for name, future in self.training.items() if future.done()]
+        for name in done:
+            future = self.training.pop(name)
+            try:
+                self.models_creator.add_trained(name, future.result())
+                log.debug(
+                    f"Trained {name} model in {perf_counter()-self.training_t0:.1f}s"
+                )
+            except Exception as e:
+                self.training_errors[name] = e
+                log.error(f"Training {name} model failed: {e}", exc_info=True)
+        if not self.training:
+            self.training_timer.stop()
+        if done and self.step == Steps.model_selection:
+            self.refresh_model_stats()
+
+    def stop_training(self):
+        self.training_timer.stop()
+        self.training = dict()
+        self.models_creator.stop_training()
 
     def _show_training_summary(self):
         out = ["MODEL |  EVA  |  MAE  |  MTD  |  PACE  "]
@@ -163,6 +112,8 @@ class CLI:
             out.append(
                 f"{model:^5} | {ev:^5.0%} | {mae:^5.0f} | {mtd:^5.0f} | {pace:^6}"
             )
+        out.extend(f"{model:^5} | training..." for model in self.training)
+        out.extend(f"{model:^5} | failed" for model in self.training_errors)
         self.send_output("\n".join(out))
 
     def show_model_stats(self):
@@ -171,10 +122,24 @@ class CLI:
         self._show_training_summary()
         self.step = Steps.model_selection
 
+    def refresh_model_stats(self):
+        """Redraws the summary, keeping the command typed so far"""
+        typed = self.fcc.console.toPlainText().split("\n")[-1][
+            len(self.fcc.console_prompt) :
+        ]
+        self.show_model_stats()
+        self.send_output(self.fcc.console_prompt + typed)
+        self.fcc.move_cursor_to_end()
+
     def model_selection(self, parsed_cmd: list):
         sel_model = parsed_cmd[0].upper()
         if not sel_model:
             self.step = Steps.done
+        elif sel_model in self.training:
+            self.cls()
+            self.send_output("Selected model is still being trained. Try again")
+            self.set_output_prompt("Press Enter to continue...")
+            self.step = Steps.model_display
         elif sel_model not in self.available_models:
             self.cls()
             self.send_output("Selected model is not available. Try again")
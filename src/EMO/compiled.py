@@ -0,0 +1,216 @@
+"""
+EFC models compiled to plain arrays, predicted with numpy alone. Loading
+one imports neither sklearn nor feature_engine, and the predictions skip
+their input validation and DataFrames
+"""
+
+import os
+import json
+import numpy as np
+from EMO.inference import predict_cst
+
+COMPILED_VERSION = 1
+_TREE_FIELDS = ("left", "right", "feature", "threshold", "value")
+
+
+class CompiledModel:
+    """
+    Discretizes, scales and predicts like the Model it was compiled from.
+    The kind is one of: cst, linear, svr, forest, boosting
+    """
+
+    def __init__(self, meta: dict, arrays: dict[str, np.ndarray]):
+        self.name = meta["name"]
+        self.kind = meta["kind"]
+        self.lng_cols = tuple(meta["lng_cols"])
+        self.is_online = meta["is_online"]
+        self.discretizer = meta["discretizer"]
+        self.meta = meta
+        self.arrays = arrays
+        self.mtime = 0
+
+    def predict(self, records: list[list], lng: str = "") -> np.ndarray:
+        x = np.array(records, dtype=float)
+        if self.kind == "cst":
+            return predict_cst(x)
+        if self.lng_cols:
+            enc_lngs = [float(l == lng) for l in self.lng_cols]
+            x = np.hstack([x, np.tile(enc_lngs, (len(x), 1))])
+        x = self._discretize(x)
+        a = self.arrays
+        x = (x - a["x_mean"]) / a["x_scale"]
+        if self.kind == "linear":
+            y = x @ a["coef"] + a["intercept"]
+        elif self.kind == "svr":
+            sq_dist = (
+                (x**2).sum(axis=1)[:, None]
+                + (a["sv"] ** 2).sum(axis=1)[None, :]
+                - 2 * x @ a["sv"].T
+            )
+            y = np.exp(-self.meta["gamma"] * sq_dist) @ a["dual_coef"] + a["intercept"]
+        elif self.kind == "forest":
+            y = _eval_trees(x, a, "trees_").mean(axis=0)
+        else:
+            y = self.meta["base"] + self.meta["rate"] * _eval_trees(x, a, "trees_").sum(
+                axis=0
+            )
+        return (y * a["y_scale"] + a["y_mean"]).reshape(-1, 1)
+
+    def _discretize(self, x: np.ndarray) -> np.ndarray:
+        if not self.discretizer:
+            return x
+        cols = self.arrays["disc_cols"]
+        x = x.copy()
+        if self.discretizer == "decision-tree":
+            x[:, cols] = _eval_trees(x, self.arrays, "disc_").T
+        else:
+            x[:, cols] = _yeo_johnson(x[:, cols], self.arrays["disc_lambdas"])
+        return x
+
+
+def _eval_trees(x: np.ndarray, arrays: dict, prefix: str) -> np.ndarray:
+    """
+    Walks all the trees stored under the <prefix> at once. Returns their leaf
+    values of shape (trees, records). Inputs are compared as float32, as by
+    sklearn
+    """
+    left, right, feature, threshold, value = (
+        arrays[f"{prefix}{k}"] for k in _TREE_FIELDS
+    )
+    x = x.astype(np.float32)
+    rows = np.arange(len(x))
+    node = np.repeat(arrays[f"{prefix}roots"][:, None], len(x), axis=1)
+    # Leaves point to themselves, so the walk ends once all nodes stay put
+    while True:
+        nxt = np.where(
+            x[rows, feature[node]] <= threshold[node], left[node], right[node]
+        )
+        if np.array_equal(nxt, node):
+            return value[node]
+        node = nxt
+
+
+def _yeo_johnson(x: np.ndarray, lambdas: np.ndarray) -> np.ndarray:
+    lambdas = np.broadcast_to(lambdas, x.shape)
+    out = np.empty_like(x)
+    pos = x >= 0
+    for mask, sign, lmb in ((pos, 1, lambdas), (~pos, -1, 2 - lambdas)):
+        v, l = np.log1p(sign * x[mask]), lmb[mask]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[mask] = sign * np.where(
+                l == 0, v, np.expm1(l * v) / np.where(l == 0, 1, l)
+            )
+    return out
+
+
+def _flatten_trees(trees: list, features: list[int] = None) -> dict[str, np.ndarray]:
+    """
+    Concatenates fitted sklearn trees, offsetting the child nodes. Features
+    of single-feature trees are mapped to the <features> columns
+    """
+    parts = {k: list() for k in _TREE_FIELDS}
+    roots, offset = list(), 0
+    for i, est in enumerate(trees):
+        t = est.tree_
+        is_split = t.children_left >= 0
+        nodes = np.arange(t.node_count) + offset
+        roots.append(offset)
+        parts["left"].append(np.where(is_split, t.children_left + offset, nodes))
+        parts["right"].append(np.where(is_split, t.children_right + offset, nodes))
+        feature = t.feature if features is None else np.full(t.node_count, features[i])
+        parts["feature"].append(np.where(is_split, feature, 0))
+        parts["threshold"].append(t.threshold)
+        parts["value"].append(t.value[:, 0, 0])
+        offset += t.node_count
+    res = {k: np.concatenate(v) for k, v in parts.items()}
+    res["roots"] = np.array(roots, dtype=np.int64)
+    return res
+
+
+def _scaler(prefix: str, scaler, size: int) -> dict[str, np.ndarray]:
+    if scaler is None:
+        return {f"{prefix}_mean": np.zeros(size), f"{prefix}_scale": np.ones(size)}
+    return {f"{prefix}_mean": scaler.mean_, f"{prefix}_scale": scaler.scale_}
+
+
+def compile_model(model) -> tuple[dict, dict[str, np.ndarray]]:
+    """Extracts the parameters of a fitted EMO Model"""
+    meta = {
+        "version": COMPILED_VERSION,
+        "name": model.name,
+        "lng_cols": list(model.lng_cols),
+        "is_online": getattr(model, "is_online", False),
+        "discretizer": None,
+    }
+    arrays = dict()
+    if model.name == "CST":
+        return {**meta, "kind": "cst"}, arrays
+    est = model.model
+    n_features = len(model.rec_cols)
+    disc = model.discretizer
+    if disc is not None:
+        cols = [model.rec_cols.index(c) for c in disc.variables_]
+        arrays["disc_cols"] = np.array(cols, dtype=np.int64)
+        if hasattr(disc, "binner_dict_"):
+            if getattr(disc, "precision", None) is not None:
+                raise ValueError("Rounded discretizer outputs are not supported")
+            meta["discretizer"] = "decision-tree"
+            trees = [
+                getattr(disc.binner_dict_[c], "best_estimator_", disc.binner_dict_[c])
+                for c in disc.variables_
+            ]
+            arrays.update(
+                {f"disc_{k}": v for k, v in _flatten_trees(trees, cols).items()}
+            )
+        else:
+            meta["discretizer"] = "yeo-johnson"
+            arrays["disc_lambdas"] = np.array(
+                [disc.lambda_dict_[c] for c in disc.variables_], dtype=float
+            )
+    # Only the SVR and SGD models are fitted on standardized data
+    suffix = model.name.lower()
+    arrays.update(_scaler("x", model.anc.get(f"scx_{suffix}"), n_features))
+    arrays.update(_scaler("y", model.anc.get(f"scy_{suffix}"), 1))
+    if model.name in {"LAS", "SGD"}:
+        meta["kind"] = "linear"
+        arrays["coef"] = np.ravel(est.coef_)
+        arrays["intercept"] = np.ravel(est.intercept_)
+    elif model.name == "SVR":
+        meta["kind"] = "svr"
+        meta["gamma"] = float(est._gamma)
+        arrays["sv"] = est.support_vectors_
+        arrays["dual_coef"] = np.ravel(est.dual_coef_)
+        arrays["intercept"] = np.ravel(est.intercept_)
+    elif model.name == "RFR":
+        meta["kind"] = "forest"
+        arrays.update(
+            {f"trees_{k}": v for k, v in _flatten_trees(est.estimators_).items()}
+        )
+    elif model.name == "XGB":
+        meta["kind"] = "boosting"
+        meta["rate"] = float(est.learning_rate)
+        meta["base"] = float(np.ravel(est.init_.predict(np.zeros((1, n_features))))[0])
+        arrays.update(
+            {f"trees_{k}": v for k, v in _flatten_trees(est.estimators_[:, 0]).items()}
+        )
+    else:
+        raise ValueError(f"Cannot compile a {model.name} model")
+    return meta, arrays
+
+
+def save_compiled(path: str, model):
+    """Compiles the <model> to a numpy archive, replacing the <path> at once"""
+    meta, arrays = compile_model(model)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_compiled(path: str) -> CompiledModel:
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(data["meta"].item())
+        if meta["version"] != COMPILED_VERSION:
+            raise ValueError(f"Unsupported compiled model version: {meta['version']}")
+        arrays = {k: data[k] for k in data.files if k != "meta"}
+    return CompiledModel(meta, arrays)
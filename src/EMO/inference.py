@@ -0,0 +1,141 @@
+import numpy as np
+from typing import Callable, Optional
+
+# Coefficients of the forgetting curve strength
+CST_PARAMS = (2.039, -4.566, -12.495, -0.001)
+
+
+class CalcCancelled(Exception):
+    """Raised when a newer EFC calculation supersedes the running one"""
+
+
+def cst_strength(records: np.ndarray) -> np.ndarray:
+    """Memory strength of each record, in days"""
+    x1, x2, x3, x4 = CST_PARAMS
+    total, repeated_times, prev_score = records[:, 0], records[:, 4], records[:, 5]
+    return (repeated_times**x1 + 0.01 * prev_score * x2) - (x3 * np.exp(total * x4))
+
+
+def predict_cst(records) -> np.ndarray:
+    """
+    Based on Ebbinghaus Forgetting Curve. Estimates the percentage of words
+    in-memory for each of the <records>. Returns a (n, 1) array
+    """
+    if not len(records):
+        return np.empty((0, 1))
+    records = np.asarray(records, dtype=float)
+    s = cst_strength(records)
+    return (100 * np.exp(-records[:, 3] / (24 * s))).reshape(-1, 1)
+
+
+def invert_cst(records, efc: float) -> np.ndarray:
+    """Returns TIMEDELTA_LAST_REV at which each record reaches the <efc>"""
+    if not len(records):
+        return np.empty(0)
+    records = np.asarray(records, dtype=float)
+    return -24 * cst_strength(records) * np.log(efc / 100)
+
+
+def solve_due(
+    predict: Callable[[np.ndarray], np.ndarray],
+    records,
+    threshold: float,
+    warm_start=None,
+    resh=800,
+    max_steps=8,
+    max_cycles=40,
+    t_tol=0.01,
+    h_tol=0.001,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> np.ndarray:
+    """
+    Returns #hours to efc falling below the <threshold> for each record
+    predict - maps records to their efc scores, (n,) array
+    resh - initial step in hours when looking for the crossing
+    max_steps - limit of doubling steps, beyond which records are left as is
+    warm_start - current efc values of the records
+    t_tol - target diff tolerance in points
+    h_tol - stops once the crossing is narrowed down to that many hours
+    cancelled - polled before each cycle, raises CalcCancelled once True
+    All records advance together - each cycle costs one batched prediction
+    """
+    x = np.array(records, dtype=float)
+    init = x[:, 3].copy()
+
+    def _predict(rows: np.ndarray, t: np.ndarray) -> np.ndarray:
+        if cancelled and cancelled():
+            raise CalcCancelled
+        x[rows, 3] = t
+        return np.asarray(predict(x[rows]), dtype=float).reshape(-1)
+
+    if warm_start is None:
+        efc = _predict(np.arange(len(x)), init)
+    else:
+        efc = np.asarray(warm_start, dtype=float)
+    # +1 where efc is above the threshold, so the crossing is in the future
+    sign = np.where(efc > threshold, 1.0, -1.0)
+    res = init.copy()
+    pending = np.abs(efc - threshold) > t_tol
+    bracketed = np.zeros(len(x), dtype=bool)
+    cycles = 0
+
+    # Bracket the crossings with steps that double in size
+    lo, hi = init.copy(), init.copy()
+    step = np.full(len(x), float(resh))
+    while pending.any() and cycles < max_steps:
+        rows = np.flatnonzero(pending)
+        lo[rows] = hi[rows]
+        hi[rows] += sign[rows] * step[rows]
+        step[rows] *= 2
+        efc = _predict(rows, hi[rows])
+        res[rows] = hi[rows]
+        hit = np.abs(efc - threshold) <= t_tol
+        crossed = sign[rows] * (efc - threshold) <= 0
+        pending[rows[hit | crossed]] = False
+        bracketed[rows[crossed & ~hit]] = True
+        cycles += 1
+
+    # Then bisect them
+    rows = np.flatnonzero(bracketed)
+    while len(rows) and cycles < max_cycles:
+        mid = (lo[rows] + hi[rows]) / 2
+        efc = _predict(rows, mid)
+        res[rows] = mid
+        above = sign[rows] * (efc - threshold) > 0
+        lo[rows[above]] = mid[above]
+        hi[rows[~above]] = mid[~above]
+        done = (np.abs(efc - threshold) <= t_tol) | (
+            np.abs(hi[rows] - lo[rows]) <= h_tol
+        )
+        rows = rows[~done]
+        cycles += 1
+
+    return res - init
+
+
+def predict_efc(
+    model,
+    records: np.ndarray,
+    threshold: float,
+    lng: str = "",
+    preds: bool = True,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns efc scores of the <records> and, if <preds>, hours until they
+    fall below the <threshold>. Models with a closed form invert it
+    """
+    efc = np.asarray(model.predict(records, lng=lng), dtype=float).reshape(-1)
+    if not preds:
+        due = np.zeros(len(records))
+    elif hasattr(model, "invert"):
+        due = model.invert(records, threshold) - records[:, 3]
+    else:
+        due = solve_due(
+            lambda x: model.predict(x.tolist(), lng=lng),
+            records,
+            threshold,
+            warm_start=efc,
+            cancelled=cancelled,
+        )
+    return efc, due
@@ -59,6 +59,7 @@ class EMOSpawn:
         self.mw.fcc.console.append(self.mw.fcc.console_prompt)
 
     def remove_adapter(self):
+        self.cli.stop_training()
         self.mw.fcc.cls()
         self.mw.fcc.fcc.post_fcc = self.orig_post_method
         self.mw.setWindowTitle(self.mw.tab_map["fcc"]["title"])
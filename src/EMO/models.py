@@ -2,6 +2,10 @@ import pandas as pd
 import numpy as np
 import os
 import logging
+import multiprocessing
+from time import perf_counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
 from enum import Enum
 from collections import namedtuple
 from random import randint
@@ -14,8 +18,8 @@ from sklearn.metrics import (
     mean_absolute_error,
     mean_tweedie_deviance,
 )
-from math import exp
-from DBAC import db_conn
+from EMO.inference import predict_cst
+from EMO.compiled import save_compiled
 
 log = logging.getLogger("EMO")
 
@@ -74,14 +78,30 @@ class Model:
             "LAS": self._predict_las,
             "RFR": self._predict_rfr,
             "XGB": self._predict_xgb,
+            "SGD": self._predict_sgd,
             "CST": Model._predict_cst,
         }[model_name]
 
+    @property
+    def is_online(self) -> bool:
+        """Whether the model can be updated with new records, without a retrain"""
+        return self.name == "SGD"
+
     def predict(self, records: list[list], lng: str = "") -> list[list]:
+        return self.__predict(self.__encode_lngs(records, lng))
+
+    def partial_fit(self, records: list[list], scores: list, lng: str = ""):
+        """Takes a step of the online model towards the actual <scores>"""
+        y = self.anc["scy_sgd"].transform(np.array(scores, dtype=float).reshape(-1, 1))
+        self.model.partial_fit(
+            self._transform_sgd(self.__encode_lngs(records, lng)), y.ravel()
+        )
+
+    def __encode_lngs(self, records: list[list], lng: str) -> list[list]:
         if self.__language_specific_model:
             enc_lngs = [int(l == lng) for l in self.lng_cols]
-            records = [r + enc_lngs for r in records]
-        return self.__predict(records)
+            records = [list(r) + enc_lngs for r in records]
+        return records
 
     def _predict_svr(self, records: list[list]):
         if self.discretizer:
@@ -99,7 +119,7 @@ class Model:
             records = self.discretizer.transform(
                 pd.DataFrame(data=records, columns=self.rec_cols)
             ).values
-        return [self.model.predict([p]) for p in records]
+        return self.model.predict(np.array(records)).reshape(-1, 1)
 
     def _predict_rfr(self, records: list[list]):
         if self.discretizer:
@@ -115,23 +135,21 @@ class Model:
             )
         return self.model.predict(np.array(records)).reshape(-1, 1)
 
+    def _transform_sgd(self, records: list[list]) -> np.ndarray:
+        if self.discretizer:
+            records = self.discretizer.transform(
+                pd.DataFrame(data=records, columns=self.rec_cols)
+            ).values
+        return self.anc["scx_sgd"].transform(np.array(records))
+
+    def _predict_sgd(self, records: list[list]):
+        return self.anc["scy_sgd"].inverse_transform(
+            self.model.predict(self._transform_sgd(records)).reshape(-1, 1)
+        )
+
     @staticmethod
     def _predict_cst(record: list[list]):
-        preds = list()
-        for r in record:
-            (
-                total,
-                prev_wpm,
-                ts_creation,
-                ts_last_rev,
-                repeated_times,
-                prev_score,
-                *_,
-            ) = r
-            x1, x2, x3, x4 = 2.039, -4.566, -12.495, -0.001
-            s = (repeated_times**x1 + 0.01 * prev_score * x2) - (x3 * exp(total * x4))
-            preds.append([100 * exp(-ts_last_rev / (24 * s))])
-        return preds
+        return predict_cst(record)
 
 
 class Models:
@@ -140,87 +158,81 @@ class Models:
         self.random_state = randint(0, 2137)
         self.models = dict()
         self.evaluation = dict()
+        # Seconds spent on fitting and evaluating the models trained on the split
+        self.timings = dict()
+        self.executor: Optional[ProcessPoolExecutor] = None
 
-    def prep_SVR(self, data: pd.DataFrame):
+    def split(self, data: pd.DataFrame):
+        """Splits the <data> once for all the models trained on it"""
         x, y = data.iloc[:, :-1], data.iloc[:, -1:]
-        x_train_svr, self.x_test_svr, y_train_svr, self.y_test_svr = train_test_split(
+        self.x_train, self.x_test, self.y_train, self.y_test = train_test_split(
             x.values, y.values, test_size=self.size_test, random_state=self.random_state
         )
+        self.y_test = np.array(self.y_test).reshape(-1, 1)
+
+    def prep_SVR(self, data: Optional[pd.DataFrame] = None):
+        if data is not None:
+            self.split(data)
         self.scx_svr = StandardScaler()
         self.scy_svr = StandardScaler()
-        x_train_svr = self.scx_svr.fit_transform(x_train_svr)
-        y_train_svr = self.scy_svr.fit_transform(y_train_svr)
+        x_train_svr = self.scx_svr.fit_transform(self.x_train)
+        y_train_svr = self.scy_svr.fit_transform(self.y_train)
         svr_model = svm.SVR(kernel="rbf")
         svr_model.fit(x_train_svr, y_train_svr.ravel())
-        self.y_test_svr = np.array(self.y_test_svr).reshape(-1, 1)
         self.models["SVR"] = svr_model
 
     def eval_SVR(self):
-        transformed_xs = self.scx_svr.transform(self.x_test_svr)
+        transformed_xs = self.scx_svr.transform(self.x_test)
         predictions = self.scy_svr.inverse_transform(
             self.models["SVR"].predict(np.array(transformed_xs)).reshape(-1, 1)
         )
         self.evaluation["SVR"] = m_eval(
-            explained_variance_score(self.y_test_svr, predictions),
-            mean_absolute_error(self.y_test_svr, predictions),
-            mean_tweedie_deviance(self.y_test_svr, predictions),
-            self.y_test_svr,
+            explained_variance_score(self.y_test, predictions),
+            mean_absolute_error(self.y_test, predictions),
+            mean_tweedie_deviance(self.y_test, predictions),
+            self.y_test,
             predictions,
         )
 
-    def prep_LASSO(self, data: pd.DataFrame):
-        x, y = data.iloc[:, :-1], data.iloc[:, -1:]
-        x_train_las, self.x_test_las, y_train_las, self.y_test_las = train_test_split(
-            x.values, y.values, test_size=self.size_test, random_state=self.random_state
-        )
+    def prep_LASSO(self, data: Optional[pd.DataFrame] = None):
+        if data is not None:
+            self.split(data)
         lasso_model = linear_model.Lasso(alpha=0.1)
-        lasso_model.fit(x_train_las, y_train_las)
-        self.y_test_las = np.array(self.y_test_las).reshape(-1, 1)
-        self.x_test_las = np.array(self.x_test_las)
+        lasso_model.fit(self.x_train, self.y_train)
         self.models["LAS"] = lasso_model
 
     def eval_LASSO(self):
-        predictions = [
-            self.models["LAS"].predict(pd.DataFrame(data=p).transpose())
-            for p in self.x_test_las
-        ]
+        predictions = self.models["LAS"].predict(np.array(self.x_test)).reshape(-1, 1)
         self.evaluation["LAS"] = m_eval(
-            explained_variance_score(self.y_test_las, predictions),
-            mean_absolute_error(self.y_test_las, predictions),
-            mean_tweedie_deviance(self.y_test_las, predictions),
-            self.y_test_las,
+            explained_variance_score(self.y_test, predictions),
+            mean_absolute_error(self.y_test, predictions),
+            mean_tweedie_deviance(self.y_test, predictions),
+            self.y_test,
             predictions,
         )
 
-    def prep_RFR(self, data: pd.DataFrame):
-        x, y = data.iloc[:, :-1], data.iloc[:, -1:]
-        x_train_rfr, self.x_test_rfr, y_train_rfr, self.y_test_rfr = train_test_split(
-            x.values, y.values, test_size=self.size_test, random_state=self.random_state
-        )
+    def prep_RFR(self, data: Optional[pd.DataFrame] = None):
+        if data is not None:
+            self.split(data)
         regressor_rfr = ensemble.RandomForestRegressor(
             n_estimators=40, random_state=42, max_depth=9, min_samples_leaf=6
         )
-        regressor_rfr.fit(x_train_rfr, y_train_rfr.ravel())
-        self.y_test_rfr = np.array(self.y_test_rfr).reshape(-1, 1)
+        regressor_rfr.fit(self.x_train, self.y_train.ravel())
         self.models["RFR"] = regressor_rfr
 
     def eval_RFR(self):
-        predictions = (
-            self.models["RFR"].predict(np.array(self.x_test_rfr)).reshape(-1, 1)
-        )
+        predictions = self.models["RFR"].predict(np.array(self.x_test)).reshape(-1, 1)
         self.evaluation["RFR"] = m_eval(
-            explained_variance_score(self.y_test_rfr, predictions),
-            mean_absolute_error(self.y_test_rfr, predictions),
-            mean_tweedie_deviance(self.y_test_rfr, predictions),
-            self.y_test_rfr,
+            explained_variance_score(self.y_test, predictions),
+            mean_absolute_error(self.y_test, predictions),
+            mean_tweedie_deviance(self.y_test, predictions),
+            self.y_test,
             predictions,
         )
 
-    def prep_XGB(self, data: pd.DataFrame):
-        x, y = data.iloc[:, :-1], data.iloc[:, -1:]
-        x_train_xgb, self.x_test_xgb, y_train_xgb, self.y_test_xgb = train_test_split(
-            x.values, y.values, test_size=self.size_test, random_state=self.random_state
-        )
+    def prep_XGB(self, data: Optional[pd.DataFrame] = None):
+        if data is not None:
+            self.split(data)
         model = ensemble.GradientBoostingRegressor()
         param_grid = {
             "n_estimators": [100],
@@ -237,22 +249,77 @@ class Models:
             cv=5,
             n_jobs=-1,
         )
-        search.fit(x_train_xgb, y_train_xgb.ravel())
-        self.y_test_xgb = np.array(self.y_test_xgb).reshape(-1, 1)
+        search.fit(self.x_train, self.y_train.ravel())
         self.models["XGB"] = search.best_estimator_
 
     def eval_XGB(self):
-        predictions = (
-            self.models["XGB"].predict(np.array(self.x_test_xgb)).reshape(-1, 1)
-        )
+        predictions = self.models["XGB"].predict(np.array(self.x_test)).reshape(-1, 1)
         self.evaluation["XGB"] = m_eval(
-            explained_variance_score(self.y_test_xgb, predictions),
-            mean_absolute_error(self.y_test_xgb, predictions),
-            mean_tweedie_deviance(self.y_test_xgb, predictions),
-            self.y_test_xgb,
+            explained_variance_score(self.y_test, predictions),
+            mean_absolute_error(self.y_test, predictions),
+            mean_tweedie_deviance(self.y_test, predictions),
+            self.y_test,
             predictions,
         )
 
+    def prep_SGD(self, data: Optional[pd.DataFrame] = None):
+        if data is not None:
+            self.split(data)
+        self.scx_sgd = StandardScaler()
+        self.scy_sgd = StandardScaler()
+        x_train_sgd = self.scx_sgd.fit_transform(self.x_train)
+        y_train_sgd = self.scy_sgd.fit_transform(self.y_train)
+        # Adaptive rate stays at eta0 for the online updates
+        sgd_model = linear_model.SGDRegressor(
+            learning_rate="adaptive", eta0=0.01, random_state=self.random_state
+        )
+        sgd_model.fit(x_train_sgd, y_train_sgd.ravel())
+        self.models["SGD"] = sgd_model
+
+    def eval_SGD(self):
+        predictions = self.scy_sgd.inverse_transform(
+            self.models["SGD"]
+            .predict(self.scx_sgd.transform(self.x_test))
+            .reshape(-1, 1)
+        )
+        self.evaluation["SGD"] = m_eval(
+            explained_variance_score(self.y_test, predictions),
+            mean_absolute_error(self.y_test, predictions),
+            mean_tweedie_deviance(self.y_test, predictions),
+            self.y_test,
+            predictions,
+        )
+
+    def start_training(self, names: list[str]) -> dict[str, Future]:
+        """
+        Fits and evaluates the <names> models concurrently in worker
+        processes, on the current split. Results are added by add_trained
+        """
+        self.executor = ProcessPoolExecutor(
+            max_workers=min(len(names), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        return {
+            name: self.executor.submit(
+                train_model, name, self.x_train, self.y_train, self.x_test, self.y_test
+            )
+            for name in names
+        }
+
+    def add_trained(self, name: str, result: tuple):
+        model, evaluation, attrs, timings = result
+        self.models[name] = model
+        self.evaluation[name] = m_eval(*evaluation)
+        self.timings[name] = timings
+        for k, v in attrs.items():
+            setattr(self, k, v)
+
+    def stop_training(self):
+        """Drops the models yet to be trained"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
     def prep_CST(self, data: pd.DataFrame):
         x, y = data.iloc[:, :-1], data.iloc[:, -1:]
         _, self.x_test_cst, _, self.y_test_cst = train_test_split(
@@ -272,6 +339,9 @@ class Models:
 
     def save_model(self, model_name: str, lng_cols: tuple, approach: str, **kwargs):
         """Use first-class function to save selected model to a file"""
+        # Imported here, so that unpickling a model does not load the db
+        from DBAC import db_conn
+
         if model_name == "SVR":
             model = Model(
                 model_name,
@@ -282,6 +352,16 @@ class Models:
                 scy_svr=self.scy_svr,
                 **kwargs,
             )
+        elif model_name == "SGD":
+            model = Model(
+                model_name,
+                self.models["SGD"],
+                approach=approach,
+                lng_cols=lng_cols,
+                scx_sgd=self.scx_sgd,
+                scy_sgd=self.scy_sgd,
+                **kwargs,
+            )
         elif model_name in {"LAS", "RFR", "CST", "XGB"}:
             model = Model(
                 model_name,
@@ -293,8 +373,59 @@ class Models:
         else:
             return False
 
-        joblib.dump(model, os.path.join(db_conn.RES_PATH, f"model.pkl"))
+        dump_model(model, db_conn.RES_PATH)
         log.debug(
             f"Created a new {approach} {model_name} model for Languages {lng_cols}"
         )
         return True
+
+
+def dump_model(model: Model, res_path: str):
+    """
+    Saves the <model> as model.pkl, followed by its compiled model.npz.
+    Both are replaced at once, as the EFC tab may be reading them meanwhile
+    """
+    path = os.path.join(res_path, "model.pkl")
+    joblib.dump(model, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    compiled_path = os.path.join(res_path, "model.npz")
+    try:
+        save_compiled(compiled_path, model)
+    except Exception as e:
+        log.warning(f"Failed to compile the {model.name} model: {e}", exc_info=True)
+        # A stale one would shadow the new model.pkl
+        if os.path.exists(compiled_path):
+            os.remove(compiled_path)
+
+
+# Models trained on the split data, by their Models method suffix
+TRAINED_MODELS = {
+    "LAS": "LASSO",
+    "SVR": "SVR",
+    "RFR": "RFR",
+    "XGB": "XGB",
+    "SGD": "SGD",
+}
+
+
+def train_model(name: str, x_train, y_train, x_test, y_test) -> tuple:
+    """
+    Fits and evaluates the <name> model in a worker process. Returns the
+    model, its evaluation, the attributes it needs for predictions and
+    the time spent on each step
+    """
+    models = Models()
+    models.x_train, models.y_train = x_train, y_train
+    models.x_test, models.y_test = x_test, y_test
+    t0 = perf_counter()
+    getattr(models, f"prep_{TRAINED_MODELS[name]}")()
+    t1 = perf_counter()
+    getattr(models, f"eval_{TRAINED_MODELS[name]}")()
+    timings = {"fit": t1 - t0, "eval": perf_counter() - t1}
+    attrs = {
+        k: getattr(models, k)
+        for k in ("scx_svr", "scy_svr", "scx_sgd", "scy_sgd")
+        if hasattr(models, k)
+    }
+    # m_eval instances can't be pickled under their type name
+    return models.models[name], tuple(models.evaluation[name]), attrs, timings
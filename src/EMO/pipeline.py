@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Optional
+import joblib  # type: ignore
+import pandas as pd
+from cfg import config
+from DBAC import db_conn
+from EMO.models import Models, EMOApproaches
+import EMO.augmentation as augmentation
+
+log = logging.getLogger("EMO")
+
+# Bump when the preparation steps change
+EMO_CACHE_VERSION = 1
+
+
+class Pipeline:
+    """Prepares the data and the models for the EFC Model Optimizer"""
+
+    def __init__(self):
+        self.discretizer = None
+        self.__verify_discretizer()
+        self.models_creator = Models()
+
+    def __verify_discretizer(self):
+        self.DICSRETIZERS = {
+            "yeo-johnson": augmentation.transformation_yeo_johnson,
+            "decision-tree": augmentation.decision_tree_discretizer,
+        }
+        if disc := config["EMO"].get("discretizer"):
+            if disc not in self.DICSRETIZERS.keys():
+                raise KeyError(
+                    f"Discretizer '{disc}' not in {list(self.DICSRETIZERS.keys())} "
+                )
+
+    def send_output(self, text: str, include_newline=True):
+        raise NotImplementedError
+
+    def prt_res(self, func, msg, *args, **kwargs):
+        self.send_output(msg)
+        res = func(*args, **kwargs)
+        self.send_output("OK", include_newline=False)
+        return res
+
+    def set_emo_lngs(self, lngs: list):
+        self.selected_lngs = lngs
+        log.debug(f"Selected languages: {self.selected_lngs}")
+
+    def set_emo_approach(self, approach: str):
+        if approach not in {i.value for i in EMOApproaches}:
+            raise KeyError(f"Unknown approach: '{approach}'. ")
+        self.selected_approach = approach
+        log.debug(f"Selected approach: {self.selected_approach}")
+
+    def prepare(self):
+        """
+        Runs the steps preceding the training of the models. Their results
+        are reused while the filtered history and the EMO config stay the same
+        """
+        self._prepare_data()
+        key = self.prt_res(self._get_cache_key, "Fingerprinting data... ")
+        cached = self.prt_res(self._load_cache, "Looking up cache... ", key)
+        if cached:
+            self.send_output("Using cached data")
+            raw, db_conn.db, self.discretizer = cached
+        else:
+            self._prepare_metrics()
+            raw = db_conn.db
+            self._prepare_augmentation()
+            if config["EMO"]["cache"]:
+                self.prt_res(self._save_cache, "Caching data... ", key, raw, db_conn.db)
+        # CST model must be trained on raw data
+        self.prt_res(self.models_creator.prep_CST, "Preparing CST model... ", raw)
+        self.prt_res(self.models_creator.eval_CST, "Evaluating CST model... ")
+        self.prt_res(self.models_creator.split, "Splitting data... ", db_conn.db)
+
+    def _get_cache_key(self) -> str:
+        """Fingerprint of the filtered history and the config it is prepared by"""
+        key = {
+            "version": EMO_CACHE_VERSION,
+            "lngs": self.selected_lngs,
+            "approach": self.selected_approach,
+            "discretizer": config["EMO"]["discretizer"],
+            "cap_fold": config["EMO"]["cap_fold"],
+            "rows": int(pd.util.hash_pandas_object(db_conn.db, index=False).sum()),
+            "cnt": len(db_conn.db),
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def _load_cache(self, key: str) -> Optional[tuple]:
+        if not config["EMO"]["cache"]:
+            return None
+        try:
+            cached = joblib.load(os.path.join(db_conn.RES_PATH, "emo_cache.pkl"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"Failed to load the EMO cache: {e}", exc_info=True)
+            return None
+        if cached["key"] != key:
+            return None
+        return cached["raw"], cached["data"], cached["discretizer"]
+
+    def _save_cache(self, key: str, raw: pd.DataFrame, data: pd.DataFrame):
+        path = os.path.join(db_conn.RES_PATH, "emo_cache.pkl")
+        joblib.dump(
+            {"key": key, "raw": raw, "data": data, "discretizer": self.discretizer},
+            f"{path}.tmp",
+        )
+        os.replace(f"{path}.tmp", path)
+
+    def _prepare_data(self):
+        self.prt_res(db_conn.refresh, "Loading data... ")
+        self.send_output("Filtering... ")
+        db_conn.filter_for_efc_model(self.selected_lngs)
+        if len(db_conn.db) >= config["EMO"]["min_records"]:
+            self.send_output("OK", include_newline=False)
+            self.send_output(f"{len(db_conn.db)} records submitted")
+        else:
+            self.send_output("FAILED", include_newline=False)
+            raise Exception(
+                f"Not enough records in database: {len(db_conn.db)}/{config['EMO']['min_records']}. "
+            )
+
+    def _prepare_metrics(self):
+        self.prt_res(
+            db_conn.add_efc_metrics, "Creating metrics... ", fill_timespent=True
+        )
+        self.prt_res(
+            db_conn.remove_cols_for_efc_model,
+            "Dropping obsolete columns... ",
+            drop_lng=self.selected_approach == EMOApproaches.universal.value,
+        )
+        if self.selected_approach == EMOApproaches.language_specific.value:
+            self.prt_res(
+                db_conn.encode_language_columns,
+                "Encoding Language columns...",
+                lngs=self.selected_lngs,
+            )
+            # Rearrange columns
+            db_conn.db = db_conn.db[
+                [c for c in db_conn.db.columns if c != "SCORE"] + ["SCORE"]
+            ]
+
+    def _prepare_augmentation(self):
+        db_conn.db = self.prt_res(
+            augmentation.cap_quantiles, "Capping quantiles... ", db_conn.db
+        )
+        if discretizer := self.DICSRETIZERS[config["EMO"]["discretizer"]]:
+            db_conn.db, self.discretizer = self.prt_res(
+                discretizer,
+                f"Applying {config['EMO']['discretizer']} Discretization... ",
+                db_conn.db,
+            )
+            log.debug(f"Applied {config['EMO']['discretizer']} Discretization")
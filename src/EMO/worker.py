@@ -0,0 +1,120 @@
+"""
+EFC inference in a separate process, so that the model does not hold
+the GIL of the GUI. Imports neither Qt nor the DBAC - the worker gets
+the model inputs and the path of the model
+"""
+
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+import numpy as np
+import joblib  # type: ignore
+from EMO.inference import predict_efc, CalcCancelled
+from EMO.compiled import load_compiled
+
+# State of the worker process, set by _init_worker
+_generation = None
+_model: Optional[tuple] = None  # (path, mtime, model)
+
+
+def _init_worker(generation):
+    global _generation
+    _generation = generation
+
+
+def _load_model(path: str, mtime: float):
+    """Keeps the last loaded model, until the file changes"""
+    global _model
+    if _model is None or _model[:2] != (path, mtime):
+        if path.endswith(".npz"):
+            _model = (path, mtime, load_compiled(path))
+        else:
+            _model = (path, mtime, joblib.load(path))
+    return _model[2]
+
+
+def _predict(
+    generation: int,
+    model_path: str,
+    model_mtime: float,
+    batches: dict[str, np.ndarray],
+    threshold: float,
+    preds: bool,
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    if _generation.value != generation:
+        raise CalcCancelled
+    model = _load_model(model_path, model_mtime)
+    return {
+        lng: predict_efc(
+            model,
+            records,
+            threshold,
+            lng=lng,
+            preds=preds,
+            cancelled=lambda: _generation.value != generation,
+        )
+        for lng, records in batches.items()
+    }
+
+
+class EfcWorker:
+    """
+    Runs EFC predictions in a single worker process, started on first use.
+    Each calculation takes a new generation, which makes the worker abandon
+    the one in progress
+    """
+
+    def __init__(self):
+        # Forking a process that runs Qt threads is not safe
+        self._ctx = multiprocessing.get_context("spawn")
+        self._generation = self._ctx.Value("q", 0)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation.value
+
+    def next_generation(self) -> int:
+        """Supersedes the calculation in progress, if any"""
+        with self._generation.get_lock():
+            self._generation.value += 1
+            return self._generation.value
+
+    def predict(
+        self,
+        generation: int,
+        model_path: str,
+        model_mtime: float,
+        batches: dict[str, np.ndarray],
+        threshold: float,
+        preds: bool,
+    ) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Same as predict_efc for each Language batch. Raises CalcCancelled
+        once the <generation> is superseded
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=self._ctx,
+                    initializer=_init_worker,
+                    initargs=(self._generation,),
+                )
+            future = self._executor.submit(
+                _predict, generation, model_path, model_mtime, batches, threshold, preds
+            )
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self.shutdown()
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,169 @@
+"""
+DBAC benchmark suite. Generates synthetic histories in temporary workspaces
+and runs the benchmarks for each size in a fresh process, without a GUI.
+
+Usage: python src/bench --sizes 10000 100000 1000000 --out bench.json
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from time import perf_counter
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from bench.generator import generate_history, write_history, generate_data_tree
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="bench", description=__doc__.split(".")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10**4, 10**5, 10**6])
+    parser.add_argument("--languages", nargs="+", default=["EN", "JP", "DE"])
+    parser.add_argument(
+        "--revisions", type=int, default=None, help="Revisions per Language"
+    )
+    parser.add_argument("--missing-time", type=float, default=0.05)
+    parser.add_argument("--engine", choices=("csv", "npy", "sqlite"), default="csv")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget", type=float, default=30, help="Seconds after which cases stop"
+    )
+    parser.add_argument(
+        "--sample", type=int, default=200, help="Signatures queried per accessor"
+    )
+    parser.add_argument(
+        "--tail", type=int, default=100, help="Records appended before a refresh"
+    )
+    parser.add_argument("--skip", nargs="+", default=[], help="Cases to leave out")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_report.json")
+    parser.add_argument("--keep", action="store_true", help="Keep the workspaces")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def prepare_workspace(path: str, rows: int, args: argparse.Namespace) -> dict:
+    """Lays out a db, data tree and config like the app expects in its CWD"""
+    res_dir = os.path.join(path, "src", "res")
+    os.makedirs(res_dir)
+    with open(os.path.join(SRC_DIR, "res", "config-default.json")) as f:
+        cfg = json.load(f)
+    cfg["languages"] = args.languages
+    cfg["db"]["engine"] = args.engine
+    with open(os.path.join(res_dir, "config.json"), "w") as f:
+        json.dump(cfg, f, indent=4)
+
+    t0 = perf_counter()
+    history = generate_history(
+        rows,
+        args.languages,
+        revisions=args.revisions,
+        missing_time_ratio=args.missing_time,
+        seed=args.seed,
+    )
+    write_history(os.path.join(res_dir, "db.csv"), history)
+    generate_data_tree(os.path.join(path, "data"), history, seed=args.seed)
+    return {
+        "generate": perf_counter() - t0,
+        "signatures": int(history["SIGNATURE"].nunique()),
+    }
+
+
+def run_size(rows: int, args: argparse.Namespace) -> dict:
+    path = tempfile.mkdtemp(prefix=f"fcs_bench_{rows}_")
+    try:
+        result = prepare_workspace(path, rows, args)
+        cmd = [
+            sys.executable,
+            "-m",
+            "bench",
+            "--worker",
+            *("--repeat", str(args.repeat)),
+            *("--budget", str(args.budget)),
+            *("--sample", str(args.sample)),
+            *("--tail", str(args.tail)),
+            *(("--skip", *args.skip) if args.skip else ()),
+        ]
+        env = {**os.environ, "PYTHONPATH": SRC_DIR, "QT_QPA_PLATFORM": "offscreen"}
+        try:
+            proc = subprocess.run(
+                cmd,
+                cwd=path,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=args.timeout,
+            )
+            stdout, result["returncode"] = proc.stdout, proc.returncode
+            if proc.returncode:
+                result["stderr"] = proc.stderr[-2000:]
+        except subprocess.TimeoutExpired as e:
+            stdout, result["returncode"] = e.stdout or "", "timeout"
+            if isinstance(stdout, bytes):
+                stdout = stdout.decode()
+        result["cases"] = dict()
+        for line in stdout.splitlines():
+            try:
+                case = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            result["cases"][case.pop("case")] = case
+        return result
+    finally:
+        if args.keep:
+            print(f"Kept workspace: {path}")
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=SRC_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        from bench.suite import run
+
+        run(args.repeat, args.budget, args.sample, args.tail, set(args.skip))
+        return
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in {"worker", "out"}},
+        "sizes": dict(),
+    }
+    for rows in args.sizes:
+        print(f"Benchmarking {rows} records...")
+        report["sizes"][str(rows)] = res = run_size(rows, args)
+        for case, r in res["cases"].items():
+            print(f"  {case:<45} {1000*r['median']:>10.2f}ms")
+        if res["returncode"]:
+            print(f"  Worker failed: {res['returncode']}")
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=4)
+    print(f"Saved report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
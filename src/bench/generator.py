@@ -0,0 +1,110 @@
+import os
+import numpy as np
+import pandas as pd
+
+DB_COLS = (
+    "TIMESTAMP",
+    "SIGNATURE",
+    "LNG",
+    "TOTAL",
+    "POSITIVES",
+    "SEC_SPENT",
+    "KIND",
+    "IS_FIRST",
+)
+TSFORMAT = r"%Y-%m-%dT%H:%M:%S"
+
+
+def generate_history(
+    rows: int,
+    languages: list[str],
+    revisions: int = None,
+    mistakes_ratio: float = 0.1,
+    missing_time_ratio: float = 0.05,
+    start: str = "2018-01-01",
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Simulates a db with <rows> records. Each Language has <revisions>
+    Revisions that are created over time and repeated at growing intervals
+    with improving scores, mixed with a share of Mistakes sets.
+    <missing_time_ratio> of records have SEC_SPENT=0
+    """
+    rng = np.random.default_rng(seed)
+    revisions = revisions or max(1, rows // (20 * len(languages)))
+    lng_sigs = np.repeat(np.arange(len(languages)), revisions)
+    is_mst = rng.random(len(lng_sigs)) < mistakes_ratio
+    names = np.array(
+        [
+            f"{languages[l]}_mistakes_{i}" if m else f"REV_{languages[l]}{i}"
+            for i, (l, m) in enumerate(zip(lng_sigs, is_mst))
+        ]
+    )
+
+    # Spread the records across the signatures
+    weights = rng.gamma(2.0, size=len(names))
+    sig = rng.choice(len(names), size=rows, p=weights / weights.sum())
+    sig.sort(kind="stable")
+    starts = np.searchsorted(sig, np.arange(len(names)))
+    rev_no = np.arange(rows) - starts[sig]
+
+    # Revisions are repeated at exponentially growing intervals
+    span = pd.Timestamp.now() - pd.Timestamp(start)
+    created = rng.random(len(names)) * span.total_seconds() * 0.8
+    interval = 3600 * 6 * 1.8 ** np.minimum(rev_no, 8) * rng.uniform(0.5, 1.5, rows)
+    interval[rev_no == 0] = 0
+    offsets = np.cumsum(interval)
+    offsets -= offsets[starts[sig]]
+    seconds = created[sig] + offsets
+
+    total = rng.integers(20, 120, len(names))[sig]
+    skill = rng.uniform(0.3, 0.7, len(names))[sig]
+    score = np.clip(
+        skill + 0.03 * np.minimum(rev_no, 15) + rng.normal(0, 0.1, rows), 0, 1
+    )
+    sec_spent = (total * rng.uniform(2, 8, rows)).astype(int)
+    sec_spent[rng.random(rows) < missing_time_ratio] = 0
+
+    df = pd.DataFrame(
+        {
+            "TIMESTAMP": pd.Timestamp(start)
+            + pd.to_timedelta(seconds.astype(int), unit="s"),
+            "SIGNATURE": names[sig],
+            "LNG": np.array(languages)[lng_sigs[sig]],
+            "TOTAL": total,
+            "POSITIVES": (score * total).astype(int),
+            "SEC_SPENT": sec_spent,
+            "KIND": np.where(is_mst[sig], "M", "R"),
+            "IS_FIRST": (rev_no == 0).astype(int),
+        },
+        columns=DB_COLS,
+    )
+    return df.sort_values("TIMESTAMP", kind="stable", ignore_index=True)
+
+
+def write_history(path: str, df: pd.DataFrame):
+    df.to_csv(path, sep=";", encoding="utf-8", index=False, date_format=TSFORMAT)
+
+
+def generate_data_tree(
+    path: str, history: pd.DataFrame, lng_cards: int = 400, seed: int = 0
+):
+    """Creates the lng/rev/mst files for Languages and signatures in the <history>"""
+    rng = np.random.default_rng(seed)
+    sigs = history.drop_duplicates("SIGNATURE", keep="last")
+    for lng in history["LNG"].unique():
+        for kind in ("lng", "rev", "mst"):
+            os.makedirs(os.path.join(path, lng, kind), exist_ok=True)
+        _write_cards(os.path.join(path, lng, "lng", f"{lng}.csv"), lng, rng, lng_cards)
+    for r in sigs.itertuples(index=False):
+        kind = "mst" if r.KIND == "M" else "rev"
+        _write_cards(
+            os.path.join(path, r.LNG, kind, f"{r.SIGNATURE}.csv"), r.LNG, rng, r.TOTAL
+        )
+
+
+def _write_cards(filepath: str, lng: str, rng: np.random.Generator, n: int):
+    ids = rng.integers(0, 10**6, n)
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(f"{lng},Native\n")
+        f.writelines(f"{lng.lower()}_{i},native_{i}\n" for i in ids)
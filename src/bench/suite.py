@@ -0,0 +1,446 @@
+"""
+Benchmark cases executed inside a prepared workspace. Each case prints
+a single JSON line, so results of finished cases survive a timeout
+"""
+
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import logging
+import statistics
+from time import perf_counter
+from typing import Callable, Optional
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+SIGNATURE_ACCESSORS = (
+    "get_sum_repeated",
+    "get_total_time_spent_for_signature",
+    "get_last_score",
+    "get_last_positives",
+    "get_last_time_spent",
+    "get_total_words",
+    "get_max_positives_count",
+    "get_first_datetime",
+    "get_last_datetime",
+    "get_timedelta_from_creation",
+    "get_timedelta_from_last_rev",
+    "get_count_of_records_missing_time",
+    "get_stat_chart_data",
+    "get_cre_data",
+    "get_signature_rows",
+    "get_signature_summary",
+)
+EFC_RECORDS = 5000
+EFC_TRAIN_ROWS = 2000
+EFC_PER_RECORD = 500
+CST_SIZES = (1000, 100000)
+ENGINES = ("csv", "npy", "sqlite")
+FRAME_INTERVAL = 0.016
+
+
+class Runner:
+    def __init__(self, repeat: int, budget: float, skip: set):
+        self.repeat = repeat
+        self.budget = budget
+        self.skip = skip
+
+    def case(self, name: str, fn: Callable, setup: Callable = None, **extra):
+        """
+        Runs <fn> up to <repeat> times but stops early once <budget> seconds
+        pass. <extra> values may be callables evaluated after the runs
+        """
+        if name in self.skip:
+            return
+        runs = list()
+        while len(runs) < self.repeat and (not runs or sum(runs) < self.budget):
+            if setup:
+                setup()
+            t0 = perf_counter()
+            fn()
+            runs.append(perf_counter() - t0)
+        emit(
+            name,
+            runs,
+            **{k: v() if callable(v) else v for k, v in extra.items()},
+        )
+
+
+def emit(case: str, runs: list[float], **extra):
+    res = {
+        "case": case,
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        **extra,
+    }
+    sys.stdout.write(json.dumps(res) + "\n")
+    sys.stdout.flush()
+
+
+def run(repeat: int, budget: float, sample: int, tail: int, skip: set = set()):
+    logging.basicConfig(level=logging.ERROR)
+    from cfg import config
+
+    t0 = perf_counter()
+    from DBAC import db_conn
+
+    emit("init", [perf_counter() - t0], rows=len(db_conn.db))
+    r = Runner(repeat, budget, skip)
+    r.case("load", db_conn.load, setup=replace_db_file)
+    r.case("load_unchanged", db_conn.load)
+    r.case("refresh_unchanged", db_conn.refresh)
+    r.case("refresh_tail", db_conn.refresh, setup=lambda: append_tail(tail), tail=tail)
+
+    sigs = db_conn.get_unique_signatures().astype(object).tolist()
+    sigs = sigs[:: max(1, len(sigs) // sample)][:sample]
+    for name in SIGNATURE_ACCESSORS:
+        fn = getattr(db_conn, name)
+        r.case(name, lambda: [fn(s) for s in sigs], calls=len(sigs))
+    # Lookup by a mask over the whole history, as before the signature index
+    r.case(
+        "get_signature_rows_mask",
+        lambda: [db_conn.db[db_conn.db["SIGNATURE"] == s] for s in sigs],
+        calls=len(sigs),
+    )
+
+    lng = config["languages"][0]
+    view = db_conn.view()
+    r.case("get_unique_signatures", db_conn.get_unique_signatures)
+    r.case(
+        "get_unique_signatures_with_existing_files",
+        db_conn.get_unique_signatures_with_existing_files,
+    )
+    r.case("get_unique_languages", db_conn.get_unique_languages)
+    r.case("get_cards_total", lambda: db_conn.get_cards_total(sigs))
+    r.case("get_avg_cpm", lambda: db_conn.get_avg_cpm(view=view))
+    r.case("get_avg_score", lambda: db_conn.get_avg_score(view=view))
+    r.case("get_seconds_spent_today", lambda: db_conn.get_seconds_spent_today(lng))
+    r.case(
+        "get_last_mistakes_signature_and_datetime",
+        lambda: db_conn.get_last_mistakes_signature_and_datetime(lng),
+    )
+    r.case("view_for_efc_model", lambda: db_conn.view_for_efc_model().frame())
+    r.case(
+        "view_for_progress",
+        lambda: db_conn.view_for_progress(config["languages"]).frame(),
+    )
+
+    r.case(
+        "gather_efc_record_data",
+        lambda: db_conn.gather_efc_record_data(db_conn.view_for_efc_model()),
+    )
+    r.case(
+        "add_efc_metrics",
+        db_conn.add_efc_metrics,
+        setup=lambda: (db_conn.refresh(), db_conn.filter_for_efc_model()),
+        rows=lambda: len(db_conn.db),
+    )
+    db_conn.refresh()
+    r.case("update_fds", db_conn.update_fds, files=lambda: len(db_conn.files))
+    run_engines(r, sigs, tail)
+    run_efc_models(r)
+    run_cst(r)
+    run_efc_latency(r)
+
+
+def run_engines(r: Runner, sigs: list, tail: int):
+    """
+    Loads, appends to and queries the same history with each storage engine,
+    each in its own copy of the workspace. Cases of a step are run for all
+    the engines in turn, so they are reported next to each other
+    """
+    from cfg import config
+    from DBAC import db_conn
+
+    DbOperator = type(db_conn)
+    root = os.path.abspath("engines")
+    ops = dict()
+
+    @contextmanager
+    def use(engine: str):
+        cwd, prev_engine = os.getcwd(), config["db"]["engine"]
+        os.chdir(os.path.join(root, engine))
+        config["db"]["engine"] = engine
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+            config["db"]["engine"] = prev_engine
+
+    def on(engine: str, fn: Optional[Callable]) -> Optional[Callable]:
+        def wrapped():
+            with use(engine):
+                fn(ops[engine])
+
+        return wrapped if fn else None
+
+    for engine in ENGINES:
+        path = os.path.join(root, engine)
+        os.makedirs(os.path.join(path, "src", "res"))
+        shutil.copyfile(db_conn.DB_PATH, os.path.join(path, "src", "res", "db.csv"))
+        os.symlink(os.path.abspath(db_conn.DATA_PATH), os.path.join(path, "data"))
+        with use(engine):
+            # Migrates db.csv, so the next ones start from db.npz or db.sqlite
+            DbOperator()
+            ops[engine] = DbOperator()
+            ops[engine].active_file = next(
+                fd for fd in ops[engine].files.values() if fd.kind == db_conn.KINDS.rev
+            )
+
+    lng = config["languages"][0]
+    # (step, fn, setup) - both get the DbOperator of the engine
+    steps = (
+        ("init", lambda op: DbOperator(), None),
+        (
+            "create_record",
+            lambda op: [op.create_record(50, 40, 120, 0) for _ in range(tail)],
+            None,
+        ),
+        ("refresh_tail", lambda op: op.refresh(), lambda op: append_tail(tail)),
+        (
+            "get_signature_rows",
+            lambda op: [op.get_signature_rows(s) for s in sigs],
+            lambda op: op.refresh(),
+        ),
+        (
+            "filter_for_efc_model",
+            lambda op: op.filter_for_efc_model(),
+            lambda op: op.refresh(),
+        ),
+        (
+            "get_seconds_spent_today",
+            lambda op: op.get_seconds_spent_today(lng),
+            lambda op: op.refresh(),
+        ),
+    )
+    for step, fn, setup in steps:
+        for engine in ENGINES:
+            r.case(
+                f"engines_{step}_{engine}",
+                on(engine, fn),
+                setup=on(engine, setup),
+                rows=lambda: len(ops[engine].db),
+            )
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def run_efc_models(r: Runner, records: int = EFC_RECORDS):
+    """
+    Times inference of each EMO model type over <records> revisions in
+    a single call, and over a part of them with one call per record. Then
+    the same as compiled to numpy arrays
+    """
+    from datetime import datetime
+    from itertools import cycle, islice
+    from cfg import config
+    from DBAC import db_conn
+    from EMO.models import Models, Model, EMOApproaches
+    from EMO.compiled import CompiledModel, compile_model
+
+    now = datetime.now()
+    features = db_conn.get_efc_features().values()
+    recs = [f.to_record(now) for f in islice(cycle(features), records)]
+    if not recs:
+        return
+
+    data, discretizer = get_efc_training_data()
+    models = Models()
+    for name, prep in (
+        ("CST", models.prep_CST),
+        ("LAS", models.prep_LASSO),
+        ("SVR", models.prep_SVR),
+        ("RFR", models.prep_RFR),
+        ("XGB", models.prep_XGB),
+        ("SGD", models.prep_SGD),
+    ):
+        cases = {
+            f"predict_{name}{s}"
+            for s in ("", "_per_record", "_compiled", "_compiled_per_record")
+        }
+        if cases <= r.skip:
+            continue
+        prep(data)
+        model = Model(
+            name,
+            models.models[name],
+            approach=EMOApproaches.universal,
+            lng_cols=tuple(config["languages"]),
+            discretizer=discretizer,
+            scx_svr=getattr(models, "scx_svr", None),
+            scy_svr=getattr(models, "scy_svr", None),
+            scx_sgd=getattr(models, "scx_sgd", None),
+            scy_sgd=getattr(models, "scy_sgd", None),
+        )
+        r.case(f"predict_{name}", lambda: model.predict(recs), records=len(recs))
+        r.case(
+            f"predict_{name}_per_record",
+            lambda: [model.predict([rec]) for rec in recs[:EFC_PER_RECORD]],
+            records=len(recs[:EFC_PER_RECORD]),
+        )
+        compiled = CompiledModel(*compile_model(model))
+        r.case(
+            f"predict_{name}_compiled",
+            lambda: compiled.predict(recs),
+            records=len(recs),
+        )
+        r.case(
+            f"predict_{name}_compiled_per_record",
+            lambda: [compiled.predict([rec]) for rec in recs[:EFC_PER_RECORD]],
+            records=len(recs[:EFC_PER_RECORD]),
+        )
+
+
+def get_efc_training_data() -> tuple:
+    """Samples EMO training data, prepared the way EMO does"""
+    from DBAC import db_conn
+    import EMO.augmentation as augmentation
+
+    db_conn.filter_for_efc_model()
+    db_conn.add_efc_metrics(fill_timespent=True)
+    db_conn.remove_cols_for_efc_model(drop_lng=True)
+    data = db_conn.db.sample(min(len(db_conn.db), EFC_TRAIN_ROWS), random_state=0)
+    data, discretizer = augmentation.decision_tree_discretizer(
+        augmentation.cap_quantiles(data)
+    )
+    db_conn.refresh()
+    return data, discretizer
+
+
+def replace_db_file():
+    """Swaps the db file for an identical copy, which forces a full load"""
+    from DBAC import db_conn
+
+    shutil.copyfile(db_conn.DB_PATH, f"{db_conn.DB_PATH}.tmp")
+    os.replace(f"{db_conn.DB_PATH}.tmp", db_conn.DB_PATH)
+
+
+def append_tail(n: int):
+    """Adds <n> records behind the back of the db, like another instance would"""
+    from DBAC import db_conn
+    from cfg import config
+
+    last = db_conn.db.iloc[-1]
+    rows = [
+        (
+            (last["TIMESTAMP"] + pd.Timedelta(minutes=i + 1)).strftime(
+                db_conn.TSFORMAT
+            ),
+            last["SIGNATURE"],
+            last["LNG"],
+            int(last["TOTAL"]),
+            int(last["POSITIVES"]),
+            60,
+            last["KIND"],
+            0,
+        )
+        for i in range(n)
+    ]
+    if config["db"]["engine"] == "sqlite":
+        with sqlite3.connect(db_conn.DB_SQLITE_PATH) as conn:
+            conn.executemany(
+                f"INSERT INTO records ({', '.join(db_conn.DB_COLS)}) "
+                f"VALUES ({', '.join('?' * len(db_conn.DB_COLS))})",
+                rows,
+            )
+    else:
+        with open(db_conn.DB_PATH, "a", encoding="utf-8") as f:
+            f.writelines(";".join(map(str, r)) + "\n" for r in rows)
+
+
+def run_cst(r: Runner, sizes: tuple = CST_SIZES):
+    """Times the forgetting curve predictor and its inverse at each of <sizes>"""
+    from datetime import datetime
+    from itertools import cycle, islice
+    from DBAC import db_conn
+    from EMO.inference import predict_cst, invert_cst
+
+    now = datetime.now()
+    features = list(db_conn.get_efc_features().values())
+    if not features:
+        return
+    for n in sizes:
+        recs = np.array([f.to_record(now) for f in islice(cycle(features), n)])
+        r.case(f"predict_cst_{n}", lambda: predict_cst(recs), records=n)
+        r.case(f"invert_cst_{n}", lambda: invert_cst(recs, 80), records=n)
+
+
+def run_efc_latency(r: Runner, model_name: str = "RFR"):
+    """
+    Measures how late the main thread wakes up for each frame, while EFC
+    due times of all revisions are calculated in a thread or in the worker
+    process, as the EFC tab does
+    """
+    import threading
+    import joblib
+    from time import sleep
+    from datetime import datetime
+    from cfg import config
+    from DBAC import db_conn
+    from EMO.models import Models, Model, EMOApproaches
+    from EMO.inference import predict_efc
+    from EMO.worker import EfcWorker
+
+    cases = {f"efc_ui_latency_{m}" for m in ("thread", "process")}
+    now = datetime.now()
+    recs = [f.to_record(now) for f in db_conn.get_efc_features().values()]
+    if cases <= r.skip or not recs:
+        return
+    recs = {"": np.array(recs, dtype=float)}
+    threshold = config["efc"]["threshold"]
+    data, discretizer = get_efc_training_data()
+    models = Models()
+    getattr(models, f"prep_{model_name}")(data)
+    model = Model(
+        model_name,
+        models.models[model_name],
+        approach=EMOApproaches.universal,
+        lng_cols=(),
+        discretizer=discretizer,
+        scx_svr=getattr(models, "scx_svr", None),
+        scy_svr=getattr(models, "scy_svr", None),
+    )
+    model_path = os.path.join(db_conn.RES_PATH, "bench_model.pkl")
+    joblib.dump(model, model_path)
+    worker = EfcWorker()
+
+    def in_process():
+        worker.predict(
+            worker.next_generation(), model_path, 0, recs, threshold, preds=True
+        )
+
+    def in_thread():
+        for lng, x in recs.items():
+            predict_efc(model, x, threshold, lng=lng)
+
+    in_process()  # starts the worker and loads the model
+    for mode, fn in (("thread", in_thread), ("process", in_process)):
+        if f"efc_ui_latency_{mode}" in r.skip:
+            continue
+        t = threading.Thread(target=fn)
+        delays = list()
+        t0 = perf_counter()
+        t.start()
+        # At least one frame is measured, even if the task is already done
+        while True:
+            t1 = perf_counter()
+            sleep(FRAME_INTERVAL)
+            delays.append(perf_counter() - t1 - FRAME_INTERVAL)
+            if not t.is_alive():
+                break
+        t.join()
+        delays.sort()
+        emit(
+            f"efc_ui_latency_{mode}",
+            [perf_counter() - t0],
+            records=len(recs[""]),
+            frames=len(delays),
+            frame_delay_median=statistics.median(delays),
+            frame_delay_p99=delays[int(0.99 * (len(delays) - 1))],
+            frame_delay_max=delays[-1],
+        )
+    worker.shutdown()
+    os.remove(model_path)
@@ -2,7 +2,6 @@ import json
 from collections import UserDict
 import logging
 from time import perf_counter
-from PyQt5.QtGui import QFont
 from logtools import JsonEncoder
 
 log = logging.getLogger("CFG")
@@ -24,9 +23,15 @@ class Config(UserDict):
         self.load_data()
         self.load_cache()
         self.load_theme()
-        self.load_qfonts()
         self.load_tag_mpl()
 
+    def __getattr__(self, name: str):
+        # QFonts are created on first use, so the config loads without QtGui
+        if name.startswith("qfont_"):
+            self.load_qfonts()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
     def reload(self):
         self.data.update(json.load(open(self.CFG_PATH, "r")))
 
@@ -68,6 +73,7 @@ class Config(UserDict):
         self.cache = {
             "snapshot": {"file": None, "session": None},
             "load_est": dict(),
+            "file_meta": dict(),
         }
 
     def load_theme(self):
@@ -111,6 +117,8 @@ class Config(UserDict):
             return default
 
     def load_qfonts(self):
+        from PyQt5.QtGui import QFont
+
         self.qfont_textbox = QFont(
             self.data["theme"]["font"],
             self.data["theme"]["font_textbox_size"],
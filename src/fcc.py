@@ -2,6 +2,7 @@ import re
 import logging
 from operator import methodcaller
 from datetime import datetime
+from time import perf_counter
 from random import shuffle
 import pandas as pd
 from PyQt5.QtWidgets import QTextEdit
@@ -52,6 +53,8 @@ class FCC:
             "dmp": "Dump Session Data - save config, update cache and create a tmpfcs file",
             "rmw": "Refresh Main Window GUI - adjust to system scaling",
             "pal": "Prune Audit Logs - remove redundant records",
+            "dbm": "Database Migrate - switches the storage engine. db.csv is imported into and exported from sqlite. Syntax: dbm <csv|npy|sqlite>",
+            "dmu": "Database Memory Usage - shows memory used by the loaded history per column, compared to plain object/Int64 dtypes",
         }
 
     def execute_command(self, parsed_input: list, followup_prompt: bool = True):
@@ -198,7 +201,6 @@ class FCC:
             pixlim=[0.5 * w, 0.18 * w, 0.18 * w, 0.18 * w],
             align=["left", "right", "right", "right"],
         )
-        db_conn.refresh()
         self.post_fcc(printout)
 
     def mcp(self, parsed_cmd):
@@ -462,8 +464,8 @@ class FCC:
             config["CRE"]["cards_seen"] = 0
             config["CRE"]["time_spent"] = 0
             config["CRE"]["positives"] = 0
-            config["CRE"]["cards_total"] = db_conn.get_cards_total(
-                [fd.signature for fd in db_conn.get_sorted_revisions()]
+            config["CRE"]["cards_total"] = db_conn.get_cards_count(
+                [db_conn.files[fp] for fp in revs]
             )
             self.post_fcc(
                 f"CRE initiated with {config['CRE']['cards_total']} cards in {config['CRE']['count']} revisions"
@@ -514,3 +516,25 @@ class FCC:
         """Prune Audit Logs"""
         prev_len, cur_len = audit_log_prune()
         self.post_fcc(f"{prev_len-cur_len}/{prev_len} records removed")
+
+    def dbm(self, parsed_cmd: list):
+        """Database Migrate"""
+        if len(parsed_cmd) != 2 or parsed_cmd[1] not in {"csv", "npy", "sqlite"}:
+            self.post_fcc("Usage: dbm anyOf(csv,npy,sqlite)")
+            return
+        t0 = perf_counter()
+        db_conn.set_engine(parsed_cmd[1])
+        self.post_fcc(
+            f"Database engine set to {parsed_cmd[1]} in {1000*(perf_counter()-t0):.0f}ms"
+        )
+
+    def dmu(self, parsed_cmd: list):
+        """Database Memory Usage"""
+        usage = db_conn.get_memory_usage()
+        before = sum(v[0] for v in usage.values())
+        after = sum(v[1] for v in usage.values())
+        for col, (b, a) in usage.items():
+            self.post_fcc(f"{col}: {b/1024**2:.2f}MB -> {a/1024**2:.2f}MB")
+        self.post_fcc(
+            f"Total: {before/1024**2:.2f}MB -> {after/1024**2:.2f}MB ({len(db_conn.view())} rows)"
+        )
@@ -1222,6 +1222,10 @@ class MainWindowGUI(QMainWindow, MainWindowLogic):
         self.file_monitor_clear()
         if self.active_file.tmp and self.active_file.data.shape[0] > 1:
             db_conn.create_tmp_file_backup()
+        db_conn.flush()
+        db_conn.dump_columnar()
+        db_conn.dump_efc_features()
+        self.efc.efc_worker.shutdown()
         self.create_session_snapshot()
         config.save()
 
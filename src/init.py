@@ -27,35 +27,36 @@ def configure_logging():
     matplotlib.set_loglevel("error")
 
 
-configure_logging()
-try:
-    import cfg
-except Exception as e:
-    log = logging.getLogger("FCS")
-    log.critical(e, exc_info=True)
-    sys.exit(1)
-
-logging.getLogger().setLevel(cfg.config["log_level"])
-log = logging.getLogger("FCS")
-sys.stdout.write = lambda msg: log.debug(msg, stacklevel=2) if msg != "\n" else None
-sys.stderr.write = lambda msg: log.error(msg, stacklevel=2) if msg != "\n" else None
+def handle_termination_signal(signum, frame: FrameType):
+    mw.closeEvent(None)
+    log.critical(f"Application terminated with signal {signal.Signals(signum).name}")
+    sys.exit(0)
 
-log.debug(f"Launching Flashcards {cfg.config['version']}")
 
-from gui import MainWindowGUI
+# Spawned worker processes import this module as __mp_main__
+if __name__ == "__main__":
+    configure_logging()
+    try:
+        import cfg
+    except Exception as e:
+        log = logging.getLogger("FCS")
+        log.critical(e, exc_info=True)
+        sys.exit(1)
 
-mw = MainWindowGUI()
+    logging.getLogger().setLevel(cfg.config["log_level"])
+    log = logging.getLogger("FCS")
+    sys.stdout.write = lambda msg: log.debug(msg, stacklevel=2) if msg != "\n" else None
+    sys.stderr.write = lambda msg: log.error(msg, stacklevel=2) if msg != "\n" else None
 
+    log.debug(f"Launching Flashcards {cfg.config['version']}")
 
-def handle_termination_signal(signum, frame: FrameType):
-    mw.closeEvent(None)
-    log.critical(f"Application terminated with signal {signal.Signals(signum).name}")
-    sys.exit(0)
+    from gui import MainWindowGUI
 
+    mw = MainWindowGUI()
 
-signal.signal(signal.SIGTERM, handle_termination_signal)
-signal.signal(signal.SIGINT, handle_termination_signal)
+    signal.signal(signal.SIGTERM, handle_termination_signal)
+    signal.signal(signal.SIGINT, handle_termination_signal)
 
-mw.launch_app()
+    mw.launch_app()
 
-log.debug("Application shutdown")
+    log.debug("Application shutdown")
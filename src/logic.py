@@ -93,6 +93,7 @@ class MainWindowLogic:
         )
         self.is_recorded = True
         self.skip_efc_reload_regular()
+        self.efc.learn_revision(self.active_file)
         if self.active_file.filepath in config["CRE"]["items"]:
             self._update_cre()
             fcc_queue.put_log(self._get_cre_stat())
@@ -107,6 +108,7 @@ class MainWindowLogic:
                 self.efc.recoms_qlist.takeItem(i)
                 self.efc.files_count -= 1
                 break
+        self.efc.reschedule(self.active_file)
 
     def _update_cre(self):
         config["CRE"]["items"].remove(self.active_file.filepath)
@@ -1,5 +1,7 @@
+import os
 import json
 import logging
+from datetime import datetime
 import numpy as np
 from typing import Optional, Any, Union
 from pandas import Timestamp
@@ -67,27 +69,59 @@ def audit_log(
 def audit_log_rename(
     old_filepath: str, new_filepath: str, old_signature: str, new_signature: str
 ):
-    records = []
-    with open("audit.jsonl", "r", encoding="utf-8") as f:
-        for r in f:
-            r = json.loads(r)
+    """Records the rename as an alias, applied to the audit log on compaction"""
+    alias = {
+        "ts": datetime.now().strftime(r"%Y-%m-%d %H:%M:%S,%f")[:-3],
+        "old_filepath": old_filepath,
+        "new_filepath": new_filepath,
+        "old_signature": old_signature,
+        "new_signature": new_signature,
+    }
+    with open("audit_aliases.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(alias, ensure_ascii=False) + "\n")
+
+
+def apply_audit_alias(r: dict, alias: dict):
+    try:
+        if r["path"] == alias["old_filepath"] and r["ts"] < alias["ts"]:
+            r["path"] = alias["new_filepath"]
             try:
-                if r["path"] == old_filepath:
-                    r["path"] = new_filepath
-                    try:
-                        if r["data"]["SIGNATURE"] == old_signature:
-                            r["data"]["SIGNATURE"] = new_signature
-                    except (KeyError, AttributeError, TypeError):
-                        pass
-            except KeyError:
+                if r["data"]["SIGNATURE"] == alias["old_signature"]:
+                    r["data"]["SIGNATURE"] = alias["new_signature"]
+            except (KeyError, AttributeError, TypeError):
                 pass
-            records.append(json.dumps(r, ensure_ascii=False))
+    except KeyError:
+        pass
+
+
+def audit_log_compact():
+    """Rewrites audit.jsonl with the pending renames applied"""
+    try:
+        with open("audit_aliases.jsonl", "r", encoding="utf-8") as f:
+            aliases = [json.loads(a) for a in f]
+    except FileNotFoundError:
+        return
+    __handler.acquire()
+    try:
+        records = []
+        with open("audit.jsonl", "r", encoding="utf-8") as f:
+            for r in f:
+                if not r.strip():
+                    continue
+                r = json.loads(r)
+                for alias in aliases:
+                    apply_audit_alias(r, alias)
+                records.append(json.dumps(r, ensure_ascii=False))
 
-    with open("audit.jsonl", "w", encoding="utf-8") as f:
-        f.write("\n".join(records) + "\n")
+        with open("audit.jsonl", "w", encoding="utf-8") as f:
+            f.write("\n".join(records) + "\n")
+        os.remove("audit_aliases.jsonl")
+    finally:
+        __handler.release()
 
 
 def audit_log_prune():
+    audit_log_compact()
     records = []
     rcnt = 0
     with open("audit.jsonl", "r") as f:
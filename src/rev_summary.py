@@ -59,14 +59,12 @@ class SummaryGenerator:
             progress = self.__get_summary_standard_case()
             progress += self.__get_summary_timespent()
 
-        db_conn.refresh()
         return progress
 
     def __setup_parameters(self):
-        db_conn.filter_where_lng([db_conn.active_file.lng])
-        db_conn.filter_where_not_first()
-        avg_cpm = db_conn.get_avg_cpm()
-        avg_score = db_conn.get_avg_score()
+        view = db_conn.view().where_lng([db_conn.active_file.lng]).where_not_first()
+        avg_cpm = db_conn.get_avg_cpm(view=view)
+        avg_score = db_conn.get_avg_score(view=view)
 
         self.PERCENTAGE_IMPRESSIVE = avg_score * config["summary"]["astounding"]
         self.PERCENTAGE_MEDIOCRE = avg_score * config["summary"]["mediocre"]
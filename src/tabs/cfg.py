@@ -345,6 +345,18 @@ class CfgTab(BaseTab):
         self.emo_min_records_qle = self.cfg_qle(
             config["EMO"]["min_records"], text="EMO min records"
         )
+        self.emo_parallel_cbx = self.cfg_cbx(
+            config["EMO"]["parallel_training"],
+            ["True", "False"],
+            multi_choice=False,
+            text="EMO parallel training",
+        )
+        self.emo_cache_cbx = self.cfg_cbx(
+            config["EMO"]["cache"],
+            ["True", "False"],
+            multi_choice=False,
+            text="EMO cache",
+        )
 
         self.opts_layout.add_spacer()
         self.opts_layout.add_label("Notifications")
@@ -502,6 +514,10 @@ class CfgTab(BaseTab):
         new_cfg["EMO"]["approach"] = self.emo_approach_cbx.currentDataList()[0]
         new_cfg["EMO"]["cap_fold"] = float(self.emo_cap_fold_qle.text())
         new_cfg["EMO"]["min_records"] = int(self.emo_min_records_qle.text())
+        new_cfg["EMO"]["parallel_training"] = (
+            self.emo_parallel_cbx.currentDataList()[0] == "True"
+        )
+        new_cfg["EMO"]["cache"] = self.emo_cache_cbx.currentDataList()[0] == "True"
         new_cfg["popups"]["enabled"] = (
             self.popups_enabled_cbx.currentDataList()[0] == "True"
         )
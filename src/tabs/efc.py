@@ -1,20 +1,25 @@
 import joblib  # type: ignore
 import os
+import threading
 from time import time, perf_counter
 from random import choice, shuffle
-from datetime import datetime
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import heapq
 import logging
 from PyQt5.QtWidgets import QGridLayout, QListWidget
 from PyQt5.QtCore import Qt, pyqtSlot, QTimer
-import statistics
 import numpy as np
-from math import exp
 from utils import format_seconds_to
 from int import fcc_queue, LogLvl, sched, Task
 from cfg import config
+from EMO.inference import predict_cst, invert_cst, predict_efc, CalcCancelled
+from EMO.worker import EfcWorker
+from EMO.compiled import load_compiled
 from widgets import get_scrollbar, get_button
 from tabs.base import BaseTab
-from DBAC import db_conn
+from DBAC import db_conn, FileDescriptor
+from DBAC.efc_features import EfcFeatures
 from typing import TYPE_CHECKING, Optional
 from data_types import EfcRecord, EfcRecom
 
@@ -23,6 +28,9 @@ if TYPE_CHECKING:
 
 log = logging.getLogger("EFC")
 
+# Longest interval a QTimer accepts, ~24 days
+MAX_TIMER_MS = 2**31 - 1
+
 
 class StandardModel:
     """
@@ -35,26 +43,12 @@ class StandardModel:
         self.mtime = 0
         self.lng_cols = tuple()
 
-    def predict(
-        self,
-        record: list[list],
-        lng=None,
-    ) -> list[list]:
-        preds = list()
-        for r in record:
-            (
-                total,
-                prev_wpm,
-                ts_creation,
-                ts_last_rev,
-                repeated_times,
-                prev_score,
-                *_,
-            ) = r
-            x1, x2, x3, x4 = 2.039, -4.566, -12.495, -0.001
-            s = (repeated_times**x1 + 0.01 * prev_score * x2) - (x3 * exp(total * x4))
-            preds.append([100 * exp(-ts_last_rev / (24 * s))])
-        return preds
+    def predict(self, record: list[list], lng=None) -> np.ndarray:
+        return predict_cst(record)
+
+    def invert(self, records: np.ndarray, efc: float) -> np.ndarray:
+        """Returns TIMEDELTA_LAST_REV at which each record reaches the <efc>"""
+        return invert_cst(records, efc)
 
 
 class EFCTab(BaseTab):
@@ -64,6 +58,7 @@ class EFCTab(BaseTab):
         self.id = "efc"
         self.mw = mw
         self.efc_model = StandardModel()
+        self.efc_model_path = ""
         self.is_view_outdated = True
         self._efc_last_calc_time = 0
         self._db_load_time_efc = 0
@@ -71,7 +66,22 @@ class EFCTab(BaseTab):
         self._recoms: list[EfcRecom] = list()
         self.cur_efc_index = 0
         self._calc_in_progress = False
+        # Predictions run in a worker process if enabled. A calculation gets
+        # abandoned once a newer one takes over the generation
+        self.efc_worker = EfcWorker()
+        self._calc_generation = 0
+        # Model inputs per signature, tagged with the version of their features
+        self._efc_inputs: dict[str, tuple] = dict()
+        # Min-heap of (due timestamp, filepath, EfcRecom) for files yet to be
+        # recommended. Entries superseded in _due are skipped when popped
+        self._deadlines: list[tuple[float, str, EfcRecom]] = list()
+        self._due: dict[str, float] = dict()
+        self._deadline_timer = QTimer()
+        self._deadline_timer.setSingleShot(True)
+        self._deadline_timer.setTimerType(Qt.PreciseTimer)
+        self._deadline_timer.timeout.connect(self.on_deadline)
         self.calc_job_id = "efc_calc"
+        self._online_lock = threading.Lock()
         self.build()
         self.mw.add_tab(self.tab, self.id, "EFC")
 
@@ -86,7 +96,7 @@ class EFCTab(BaseTab):
         )
 
     def init_job_calc(self) -> None:
-        task = Task(
+        self.calc_task = Task(
             functions=[self.calc_recommendations],
             op_id=self.calc_job_id,
             started=lambda _: self.disable_view(),
@@ -94,23 +104,162 @@ class EFCTab(BaseTab):
                 lambda: QTimer.singleShot(5, self.show_recommendations),
                 lambda: self.recoms_qlist.setEnabled(True),
                 lambda: self.mw.get_tab(self.mw.active_tab_id).setFocus(),
+                self.arm_deadline_timer,
             ],
             auto_delete=False,
         )
+        self.arm_deadline_timer()
 
-        def trigger():
-            adj = (
-                config.cache["load_est"].get(self.calc_job_id, 1000) / 1000
-                + 60 * config["scheduler_interval_m"]
-            )
-            return self.cache_ttl + adj <= time()
-
-        sched.add_job(self.calc_job_id, task, trigger)
+    @property
+    def background_calc_due(self) -> Optional[float]:
+        """Timestamp at which the cache should be recalculated in the background"""
         if not (
             config["efc"]["opt"]["allow_background_calc"]
             and config["efc"]["cache_expiry_hours"] > 0
         ):
-            sched.disable_job(self.calc_job_id)
+            return None
+        return (
+            self.cache_ttl - config.cache["load_est"].get(self.calc_job_id, 1000) / 1000
+        )
+
+    def arm_deadline_timer(self):
+        """Wakes up at the earliest deadline or cache expiry, whichever is first"""
+        while (
+            self._deadlines
+            and self._due.get(self._deadlines[0][1]) != self._deadlines[0][0]
+        ):
+            heapq.heappop(self._deadlines)
+        due = list()
+        if not self._calc_in_progress and self.background_calc_due is not None:
+            due.append(self.background_calc_due)
+        if self._deadlines:
+            due.append(self._deadlines[0][0])
+        if not due:
+            self._deadline_timer.stop()
+            return
+        delay = max(0, min(MAX_TIMER_MS, int(1000 * (min(due) - time()))))
+        self._deadline_timer.start(delay)
+
+    def on_deadline(self):
+        """Adds files that became due to the recommendations"""
+        now = time()
+        calc_due = self.background_calc_due
+        if calc_due is not None and calc_due <= now and not self._calc_in_progress:
+            sched.run_task(self.calc_task)
+            return
+        added = False
+        while self._deadlines and self._deadlines[0][0] <= now:
+            due, filepath, recom = heapq.heappop(self._deadlines)
+            if self._due.get(filepath) != due:
+                continue
+            del self._due[filepath]
+            fd = db_conn.files.get(filepath)
+            if not fd or any(r.filepath == filepath for r in self._recoms):
+                continue
+            if (
+                fd.kind == db_conn.KINDS.mst
+                and db_conn.get_lines_count(fd) < config["mst"]["min_size"]
+            ):
+                continue
+            self._recoms.append(recom)
+            added = True
+        if added:
+            self._sort_recoms(self._recoms)
+            self.is_view_outdated = True
+            if self.mw.active_tab_id == self.id:
+                self.show_recommendations()
+        self.arm_deadline_timer()
+
+    def push_deadline(self, due: float, recom: EfcRecom):
+        """Schedules the <recom> to be added at the <due> timestamp"""
+        self._due[recom.filepath] = due
+        heapq.heappush(self._deadlines, (due, recom.filepath, recom))
+
+    def reschedule(self, fd: FileDescriptor):
+        """Replaces the deadline of a file after its new record"""
+        self._due.pop(fd.filepath, None)
+        if fd.kind == db_conn.KINDS.mst and config["mst"]["interval_days"] > 0:
+            self.push_deadline(
+                time() + 86400 * config["mst"]["interval_days"],
+                self._get_mst_recom(fd),
+            )
+        elif fd.kind == db_conn.KINDS.rev:
+            for rev in self.get_efc_data(preds=True, signatures={fd.signature}):
+                if rev.pred_due_hours > 0:
+                    self.push_deadline(
+                        time() + 3600 * rev.pred_due_hours, self._get_rev_recom(rev)
+                    )
+        self.arm_deadline_timer()
+
+    def learn_revision(self, fd: FileDescriptor):
+        """Folds the new record of the <fd> into the model, if it learns online"""
+        if not (
+            config["efc"]["opt"]["online_learning"]
+            and fd.kind == db_conn.KINDS.rev
+            and getattr(self.efc_model, "is_online", False)
+        ):
+            return
+        # The db is only used on the GUI thread
+        sample = db_conn.get_efc_sample(fd.signature)
+        if sample is None:
+            return
+        sched.run_task(
+            Task(
+                [lambda: self._learn_revision(fd.signature, *sample)],
+                op_id="efc_online",
+                finished=[self.load_pickled_model],
+            )
+        )
+
+    def _learn_revision(self, signature: str, lng: str, record: list, score: int):
+        """
+        Fits model.pkl on the new record, then replaces it and its compiled
+        model.npz at once. They get activated once the task finishes, so the
+        predictions in progress keep the previous model
+        """
+        from EMO.models import dump_model
+
+        with self._online_lock:
+            # The compiled model in use can't be fitted
+            model = joblib.load(os.path.join(db_conn.RES_PATH, "model.pkl"))
+            model.partial_fit([record], [score], lng=lng)
+            dump_model(model, db_conn.RES_PATH)
+            log.debug(f"Updated EFC [{model.name}] model with {signature}")
+
+    def _get_rev_recom(self, rev: EfcRecord) -> EfcRecom:
+        """Recommendation of the <rev>, as of its score falling below the threshold"""
+        prefix = (
+            config["icons"]["initial"]
+            if rev.is_initial
+            else config["icons"]["revision"]
+        )
+        if rev.pred_score < config["efc"]["threshold"]:
+            pred_score = rev.pred_score
+        else:
+            pred_score = 0 if rev.is_initial else config["efc"]["threshold"]
+        return EfcRecom(
+            filepath=rev.filepath,
+            display_name=f"{prefix} {rev.signature}",
+            pred_score=pred_score,
+            is_initial=rev.is_initial,
+        )
+
+    def _get_mst_recom(self, fd: FileDescriptor) -> EfcRecom:
+        return EfcRecom(
+            filepath=fd.filepath,
+            display_name=f"{config['icons']['mistakes']} {fd.signature}",
+            pred_score=0,
+            is_initial=False,
+        )
+
+    @staticmethod
+    def _sort_recoms(recoms: list[EfcRecom]):
+        recoms.sort(
+            key=lambda r: (
+                getattr(r, config["efc"]["sort"]["key_1"]),
+                getattr(r, config["efc"]["sort"]["key_2"]),
+            )
+        )
 
     def init_cross_shortcuts(self):
         super().init_cross_shortcuts()
@@ -137,6 +286,7 @@ class EFCTab(BaseTab):
         if not (self.cache_valid or self._calc_in_progress):
             with self.mw.loading_ctx("efc.calc_recommendations"):
                 self.calc_recommendations()
+            self.arm_deadline_timer()
         if self.is_view_outdated:
             self.show_recommendations()
         self.recoms_qlist.setFocus()
@@ -273,28 +423,61 @@ class EFCTab(BaseTab):
 
     def load_pickled_model(self):
         try:
-            new_model_path = os.path.join(db_conn.RES_PATH, "model.pkl")
+            new_model_path = self._get_model_path()
             new_model_mtime = os.path.getmtime(new_model_path)
-            if self.efc_model.mtime < new_model_mtime:
-                self.efc_model = joblib.load(new_model_path)
+            if (
+                self.efc_model.mtime < new_model_mtime
+                or self.efc_model_path != new_model_path
+            ):
+                if new_model_path.endswith(".npz"):
+                    self.efc_model = load_compiled(new_model_path)
+                else:
+                    self.efc_model = joblib.load(new_model_path)
                 self.efc_model.mtime = new_model_mtime
-                log.debug(f"Activated custom EFC model: {self.efc_model.name}")
+                self.efc_model_path = new_model_path
+                log.debug(
+                    f"Activated custom EFC model: {self.efc_model.name} from {new_model_path}"
+                )
         except FileNotFoundError:
             self.efc_model = StandardModel()
+            self.efc_model_path = ""
             log.warning("Custom EFC model not found. Recoursing to the Standard Model")
 
+    def _get_model_path(self) -> str:
+        """Returns model.npz if enabled and compiled from the current model.pkl"""
+        path = os.path.join(db_conn.RES_PATH, "model.pkl")
+        compiled_path = os.path.join(db_conn.RES_PATH, "model.npz")
+        if config["efc"]["opt"]["compiled_model"]:
+            try:
+                if os.path.getmtime(compiled_path) >= os.path.getmtime(path):
+                    return compiled_path
+            except FileNotFoundError:
+                pass
+        return path
+
     def get_recommendations(self) -> list[EfcRecom]:
         """Returns EFC recommendations. Utilizes cache"""
         if not self.cache_valid:
             self.calc_recommendations()
+            self.arm_deadline_timer()
         return self._recoms
 
     @pyqtSlot()
     def calc_recommendations(self) -> None:
         """Computes new EFC recommendations"""
-        t0 = perf_counter()
         self._calc_in_progress = True
-        recoms = list()
+        generation = self._calc_generation = self.efc_worker.next_generation()
+        try:
+            self._calc_recommendations(generation)
+        finally:
+            # A superseded calculation leaves the flag to the newer one
+            if generation == self._calc_generation:
+                self._calc_in_progress = False
+
+    def _calc_recommendations(self, generation: int):
+        t0 = perf_counter()
+        recoms, deadlines = list(), list()
+        now = time()
         db_conn.refresh()
         if config["mst"]["interval_days"] > 0:
             cur = datetime.now()
@@ -302,40 +485,40 @@ class EFCTab(BaseTab):
                 fd for fd in db_conn.files.values() if fd.kind == db_conn.KINDS.mst
             ]:
                 lmt = db_conn.get_last_datetime(fd.signature)
+                recom = self._get_mst_recom(fd)
                 odt = (cur - lmt).days >= config["mst"]["interval_days"]
-                if odt and db_conn.get_lines_count(fd) >= config["mst"]["min_size"]:
-                    recoms.append(
-                        EfcRecom(
-                            filepath=fd.filepath,
-                            display_name=f"{config['icons']['mistakes']} {fd.signature}",
-                            pred_score=0,
-                            is_initial=False,
-                        )
+                if not odt:
+                    due = lmt + timedelta(days=config["mst"]["interval_days"])
+                    deadlines.append(
+                        (now + (due - cur).total_seconds(), fd.filepath, recom)
                     )
+                elif db_conn.get_lines_count(fd) >= config["mst"]["min_size"]:
+                    recoms.append(recom)
         if config["days_to_new_rev"] > 0:
             recoms.extend(self.get_new_recoms())
-        for rev in sorted(self.get_efc_data(), key=lambda x: x.pred_score):
+        try:
+            revs = self.get_efc_data(preds=True, generation=generation)
+        except CalcCancelled:
+            log.debug(f"EFC calculation #{generation} superseded")
+            return
+        for rev in sorted(revs, key=lambda x: x.pred_score):
             if rev.pred_score < config["efc"]["threshold"]:
-                prefix = (
-                    config["icons"]["initial"]
-                    if rev.is_initial
-                    else config["icons"]["revision"]
-                )
-                recoms.append(
-                    EfcRecom(
-                        filepath=rev.filepath,
-                        display_name=f"{prefix} {rev.signature}",
-                        pred_score=rev.pred_score,
-                        is_initial=rev.is_initial,
+                recoms.append(self._get_rev_recom(rev))
+            elif rev.pred_due_hours > 0:
+                deadlines.append(
+                    (
+                        now + 3600 * rev.pred_due_hours,
+                        rev.filepath,
+                        self._get_rev_recom(rev),
                     )
                 )
-        db_conn.refresh()
-        recoms.sort(
-            key=lambda r: (
-                getattr(r, config["efc"]["sort"]["key_1"]),
-                getattr(r, config["efc"]["sort"]["key_2"]),
-            )
-        )
+        self._sort_recoms(recoms)
+        if generation != self._calc_generation:
+            log.debug(f"EFC calculation #{generation} superseded")
+            return
+        heapq.heapify(deadlines)
+        self._deadlines = deadlines
+        self._due = {filepath: due for due, filepath, _ in deadlines}
         log.debug(
             f"Calculated new EFC [{self.efc_model.name}] in {1000*(perf_counter()-t0):.0f}ms"
         )
@@ -343,18 +526,21 @@ class EFCTab(BaseTab):
         self.is_view_outdated = True
         self._db_load_time_efc = db_conn.last_update
         self._efc_last_calc_time = time()
-        self._calc_in_progress = False
 
     def get_efc_data(
-        self, preds: bool = False, signatures: Optional[set] = None
+        self,
+        preds: bool = False,
+        signatures: Optional[set] = None,
+        generation: Optional[int] = None,
     ) -> list[EfcRecord]:
         """
         Calculates EFC scores for Revisions.
         Optionally: predicts hours to EFC score falling below the threshold.
+        Within a <generation> of calc_recommendations, raises CalcCancelled
+        once a newer one starts.
         """
         rev_table_data = list()
         if signatures:
-            db_conn.filter_where_signature_in(signatures)
             sorted_fds = [
                 fd
                 for fd in db_conn.get_sorted_revisions()
@@ -362,116 +548,129 @@ class EFCTab(BaseTab):
             ]
         else:
             sorted_fds = db_conn.get_sorted_revisions()
-        db_conn.filter_for_efc_model()
-        unqs = db_conn.gather_efc_record_data()
+        features = db_conn.get_efc_features()
         now = datetime.now()
-        dow = now.weekday()
-        hour = now.hour
-        month = now.month
-        for fd in sorted_fds:
-            # data: (TIMESTAMP, TOTAL, POSITIVES, SEC_SPENT, LNG)
-            data = unqs.get(fd.signature)
-            if data:
-                since_last_rev = (now - data[-1][0]).total_seconds() / 3600
-                cnt = len(data)
-                if cnt < config["init_revs_cnt"]:
-                    is_initial = True
-                    efc = [[0 if since_last_rev >= config["init_revs_inth"] else 100]]
-                    pred = (
-                        config["init_revs_inth"] - since_last_rev
-                        if since_last_rev <= config["init_revs_inth"]
-                        else 0
-                    )
-                else:
-                    is_initial = False
-                    total = data[-1][1]
-                    since_creation = (now - data[0][0]).total_seconds() / 3600
-                    prev_wpm = 60 * data[-1][1] / data[-1][3] if data[-1][3] != 0 else 0
-                    prev_score = int(100 * (data[-1][2] / data[-1][1]))
-                    first_score = int(100 * (data[0][2] / data[0][1]))
-                    std_score = statistics.pstdev([int(d[2] / d[1]) for d in data])
-                    total_time = sum(d[3] for d in data)
-                    trend_score = np.mean(
-                        np.convolve(
-                            [int(100 * x[2] / x[1]) for x in data],
-                            np.ones(3) / 3,
-                            mode="valid",
-                        )
-                    )
-                    rec = [
-                        total,
-                        prev_wpm,
-                        since_creation,
-                        since_last_rev,
-                        cnt,
-                        prev_score,
-                        first_score,
-                        dow,
-                        hour,
-                        month,
-                        std_score,
-                        total_time,
-                        trend_score,
-                    ]
-                    efc = self.efc_model.predict([rec], lng=data[-1][4])
-                    if preds:
-                        pred = self.guess_when_due(
-                            rec.copy(), warm_start=efc[0][0], lng=data[-1][4]
-                        )
-                    else:
-                        pred = 0
+        init_revs_cnt = config["init_revs_cnt"]
+        # Records for the model, predicted in one call per Language group
+        batches: dict[str, list[tuple[int, tuple]]] = dict()
+        for i, fd in enumerate(sorted_fds):
+            f = features.get(fd.signature)
+            if f is None:
                 s_efc = EfcRecord(
                     signature=fd.signature,
-                    days_since_last_rev=since_last_rev / 24,
-                    pred_score=efc[0][0],
-                    pred_due_hours=pred,
+                    days_since_last_rev="inf",
+                    pred_score=0,
+                    pred_due_hours=0,
                     filepath=fd.filepath,
-                    is_initial=is_initial,
+                    is_initial=True,
+                )
+            elif f.cnt < init_revs_cnt:
+                since_last_rev = (now - f.last_date).total_seconds() / 3600
+                efc = 0 if since_last_rev >= config["init_revs_inth"] else 100
+                pred = (
+                    config["init_revs_inth"] - since_last_rev
+                    if since_last_rev <= config["init_revs_inth"]
+                    else 0
                 )
-            else:
                 s_efc = EfcRecord(
                     signature=fd.signature,
-                    days_since_last_rev="inf",
-                    pred_score=0,
-                    pred_due_hours=0,
+                    days_since_last_rev=since_last_rev / 24,
+                    pred_score=efc,
+                    pred_due_hours=pred,
                     filepath=fd.filepath,
                     is_initial=True,
                 )
+            else:
+                lng = f.lng if self.efc_model.lng_cols else ""
+                batches.setdefault(lng, list()).append(
+                    (i, self._get_efc_input(fd.signature, f))
+                )
+                s_efc = None
             rev_table_data.append(s_efc)
 
+        records = {
+            lng: self._refresh_efc_inputs([inp for _, inp in batch], now)
+            for lng, batch in batches.items()
+        }
+        results = self._predict_efc(records, preds, generation)
+        for lng, batch in batches.items():
+            efc, due = results[lng]
+            for (i, _), since_last_rev, e, d in zip(
+                batch, records[lng][:, 3].tolist(), efc.tolist(), due.tolist()
+            ):
+                rev_table_data[i] = EfcRecord(
+                    signature=sorted_fds[i].signature,
+                    days_since_last_rev=since_last_rev / 24,
+                    pred_score=e,
+                    pred_due_hours=d,
+                    filepath=sorted_fds[i].filepath,
+                    is_initial=False,
+                )
+
         return rev_table_data
 
-    def guess_when_due(
-        self,
-        record,
-        resh=800,
-        warm_start=1,
-        max_cycles=100,
-        prog_resh=1.1,
-        t_tol=0.01,
-        lng=None,
-    ):
+    def _get_efc_input(self, signature: str, f: EfcFeatures) -> tuple:
         """
-        returns #hours to efc falling below the threshold
-        resh - step resolution in hours
-        warm_start - initial efc value
-        prog_resh - factor for adjusting resh
-        t_tol - target diff tolerance in points
+        Returns the model input of the <signature>, with dates as hours since
+        the epoch. Rebuilt only when its features change
         """
-        efc_ = warm_start or 1
-        init = record[3]
-        cycles = 0
-        while cycles < max_cycles:
-            if efc_ > config["efc"]["threshold"] + t_tol:
-                record[3] += resh
-            elif efc_ < config["efc"]["threshold"] - t_tol:
-                record[3] -= resh
-            else:
-                break
-            efc_ = self.efc_model.predict([record], lng=lng)[0][0]
-            resh /= prog_resh
-            cycles += 1
-        return record[3] - init
+        cached = self._efc_inputs.get(signature)
+        if cached is None or cached[0] != f.version:
+            epoch = datetime(1970, 1, 1)
+            cached = self._efc_inputs[signature] = (
+                f.version,
+                f.to_record(epoch),
+                (f.first_date - epoch).total_seconds() / 3600,
+                (f.last_date - epoch).total_seconds() / 3600,
+            )
+        return cached
+
+    def _refresh_efc_inputs(self, inputs: list[tuple], now: datetime) -> np.ndarray:
+        """Stacks cached model inputs and brings their time columns up to <now>"""
+        recs = np.array([rec for _, rec, _, _ in inputs], dtype=float)
+        now_h = (now - datetime(1970, 1, 1)).total_seconds() / 3600
+        recs[:, 2] = now_h - np.array([first_h for *_, first_h, _ in inputs])
+        recs[:, 3] = now_h - np.array([last_h for *_, last_h in inputs])
+        recs[:, 7:10] = now.weekday(), now.hour, now.month
+        return recs
+
+    def _predict_efc(
+        self, records: dict[str, np.ndarray], preds: bool, generation: Optional[int]
+    ) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """Returns efc scores and due hours per Language batch of <records>"""
+        threshold = config["efc"]["threshold"]
+        if generation is None:
+            cancelled = None
+        else:
+            cancelled = lambda: generation != self._calc_generation
+        if (
+            generation is not None
+            and records
+            and config["efc"]["opt"]["process_pool"]
+            and not isinstance(self.efc_model, StandardModel)
+        ):
+            try:
+                return self.efc_worker.predict(
+                    generation,
+                    self.efc_model_path,
+                    self.efc_model.mtime,
+                    records,
+                    threshold,
+                    preds,
+                )
+            except BrokenProcessPool as e:
+                log.error(f"EFC worker process failed: {e}", exc_info=True)
+        return {
+            lng: predict_efc(
+                self.efc_model,
+                recs,
+                threshold,
+                lng=lng,
+                preds=preds,
+                cancelled=cancelled,
+            )
+            for lng, recs in records.items()
+        }
 
     def get_efc_table(self, efc_table_data: list[EfcRecord]) -> list[list[str]]:
         # sort revs by number of days ago since last revision
@@ -506,26 +705,23 @@ class EFCTab(BaseTab):
     def get_new_recoms(self) -> list[EfcRecom]:
         """Periodically recommend to create new revision for every lng"""
         recoms = list()
+        now = datetime.now()
         for lng in config["languages"]:
-            for fd in db_conn.get_sorted_revisions():
-                if fd.lng == lng:
-                    time_delta = db_conn.get_timedelta_from_creation(fd.signature)
-                    if time_delta.days >= config["days_to_new_rev"]:
-                        recom_text = config["recoms"].get(lng, f"It's time for {lng}")
-                        recoms.append(
-                            EfcRecom(
-                                filepath=choice(
-                                    [
-                                        fd.filepath
-                                        for fd in db_conn.files.values()
-                                        if fd.lng == lng
-                                        and fd.kind == db_conn.KINDS.lng
-                                    ]
-                                ),
-                                display_name=recom_text,
-                                pred_score=0,
-                                is_initial=False,
-                            )
-                        )
-                    break
+            newest = db_conn.get_newest_revision(lng)
+            lng_fds = db_conn.get_language_files(lng)
+            if not (newest and lng_fds):
+                continue
+            _, created = newest
+            if (
+                created is not None
+                and (now - created).days >= config["days_to_new_rev"]
+            ):
+                recoms.append(
+                    EfcRecom(
+                        filepath=choice(lng_fds).filepath,
+                        display_name=config["recoms"].get(lng, f"It's time for {lng}"),
+                        pred_score=0,
+                        is_initial=False,
+                    )
+                )
         return recoms
@@ -30,8 +30,9 @@ class ProgressChartCanvas:
 
     def _calculate(self):
         db_conn.refresh()
-        db_conn.filter_for_progress(config["languages"])
-        df = db_conn.db
+        df = db_conn.view_for_progress(config["languages"]).frame(
+            ["TIMESTAMP", "SIGNATURE", "TOTAL", "POSITIVES"]
+        )
 
         df["TIMESTAMP"] = pd.to_datetime(df["TIMESTAMP"])
         mths = pd.date_range(
@@ -1,4 +1,3 @@
-from PyQt5.QtGui import QFont, QFontMetricsF
 from PyQt5.QtCore import QRunnable, pyqtSlot, pyqtSignal, QObject, Qt
 from collections import deque
 from functools import cache, wraps
@@ -9,9 +8,12 @@ import re
 import inspect
 from time import perf_counter
 import logging
-from typing import Union, Callable, Optional
+from typing import Union, Callable, Optional, TYPE_CHECKING
 from cfg import config
 
+if TYPE_CHECKING:
+    from PyQt5.QtGui import QFont
+
 
 log = logging.getLogger("UTL")
 
@@ -163,8 +165,10 @@ class Caliper:
     """Works on pixels!"""
 
     def __init__(
-        self, qFont: QFont, suf: str = "", fill: str = "\u0020", mg: float = 1.0
+        self, qFont: "QFont", suf: str = "", fill: str = "\u0020", mg: float = 1.0
     ):
+        from PyQt5.QtGui import QFontMetricsF
+
         self.doc_margin = mg
         self.fmetrics = QFontMetricsF(qFont)
         self.suffix = suf or config["theme"]["default_suffix"]
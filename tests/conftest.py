@@ -0,0 +1,55 @@
+"""
+The application works on relative paths, so the tests run in a temporary
+directory laid out like the application directory, with a history made
+by the bench generator. The DBAC is imported once this one is the CWD
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import pytest
+
+SRC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+sys.path.insert(0, SRC_DIR)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from bench.generator import generate_history, write_history, generate_data_tree
+
+LANGUAGES = ["EN", "DE"]
+ROWS = 3000
+HISTORY = generate_history(ROWS, LANGUAGES, revisions=40, seed=0)
+ROOT_DIR = tempfile.mkdtemp(prefix="fcs_tests_")
+INITIAL_CWD = os.getcwd()
+
+
+def make_workspace(path: str, engine: str = "csv") -> str:
+    """Lays out the db, data tree and config like the app expects in its CWD"""
+    res_dir = os.path.join(path, "src", "res")
+    os.makedirs(res_dir)
+    with open(os.path.join(SRC_DIR, "res", "config-default.json")) as f:
+        cfg = json.load(f)
+    cfg["languages"] = LANGUAGES
+    cfg["db"]["engine"] = engine
+    with open(os.path.join(res_dir, "config.json"), "w") as f:
+        json.dump(cfg, f, indent=4)
+    write_history(os.path.join(res_dir, "db.csv"), HISTORY)
+    generate_data_tree(os.path.join(path, "data"), HISTORY)
+    return path
+
+
+os.chdir(make_workspace(os.path.join(ROOT_DIR, "main")))
+
+
+def pytest_unconfigure(config):
+    os.chdir(INITIAL_CWD)
+    shutil.rmtree(ROOT_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def workspace_factory(tmp_path):
+    """Creates workspaces holding the same history, under the <tmp_path>"""
+    return lambda name, engine="csv": make_workspace(str(tmp_path / name), engine)
@@ -0,0 +1,25 @@
+"""
+A view of a signature holds the positions of its rows, it must filter
+and materialize like a mask over the whole db
+"""
+
+from DBAC import db_conn
+from conftest import LANGUAGES
+
+
+def test_where_signature():
+    db_conn.refresh()
+    db = db_conn.db
+    sig = db.loc[db["KIND"] == db_conn.KINDS.rev, "SIGNATURE"].iloc[0]
+    lng = db.loc[db["SIGNATURE"] == sig, "LNG"].iloc[0]
+    expected = db[(db["SIGNATURE"] == sig) & (db["IS_FIRST"] == 0)]
+    assert len(expected) > 1
+    for view in (
+        db_conn.view().where_signature(sig).where_not_first().where_lng(LANGUAGES),
+        db_conn.view().where_lng(lng).where_not_first().where_signature(sig),
+    ):
+        assert len(view) == len(expected)
+        assert view.sum("TOTAL") == expected["TOTAL"].sum()
+        assert view.column("POSITIVES").equals(expected["POSITIVES"])
+        assert view.frame().equals(expected)
+    assert len(db_conn.view().where_signature("MISSING")) == 0
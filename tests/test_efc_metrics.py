@@ -0,0 +1,129 @@
+"""
+add_efc_metrics must yield the same features as the original implementation,
+which walked the history row by row
+"""
+
+import statistics
+import numpy as np
+import pandas as pd
+import pytest
+from DBAC import db_conn
+from conftest import LANGUAGES
+
+# Computed from running sums instead of the whole history of a signature
+APPROX_COLS = ("STD_SCORE", "TREND_SCORE")
+
+
+def reference_add_efc_metrics(db: pd.DataFrame, fill_timespent=False) -> pd.DataFrame:
+    """add_efc_metrics as it was before the vectorization"""
+    db["TIMESTAMP"] = pd.to_datetime(db["TIMESTAMP"], format=db_conn.TSFORMAT)
+
+    sig = {k: list() for k in db["SIGNATURE"].unique()}
+    if fill_timespent:
+        avg_wpsec = db["TOTAL"].sum() / db.loc[db["SEC_SPENT"] > 0]["SEC_SPENT"].sum()
+    else:
+        avg_wpsec = 0
+    rows_to_del = list()
+    db["PREV_WPM"] = float(0)
+    db["TIMEDELTA_SINCE_CREATION"] = 0
+    db["TIMEDELTA_LAST_REV"] = 0
+    db["CUM_CNT_REVS"] = 0
+    db["PREV_SCORE"] = 0
+    db["FIRST_SCORE"] = 0
+    db["DOW"] = 0
+    db["HOUR"] = 0
+    db["MONTH"] = 0
+    db["STD_SCORE"] = float(0)
+    db["TOTAL_TIME"] = float(0)
+    db["TREND_SCORE"] = float(0)
+    db["SCORE"] = 0
+
+    for i, r in db.iterrows():
+        s = r["SIGNATURE"]
+        # Tackle missing sec_spent
+        if r["SEC_SPENT"] == 0:
+            if fill_timespent:
+                db.loc[i, "SEC_SPENT"] = int(r["TOTAL"] / avg_wpsec)
+                r["SEC_SPENT"] = int(r["TOTAL"] / avg_wpsec)
+            else:
+                rows_to_del.append(i)
+                continue
+        sig[s].append((r["TIMESTAMP"], r["TOTAL"], r["POSITIVES"], r["SEC_SPENT"]))
+        # Skip initial repetitions
+        if len(sig[s]) <= 2:
+            rows_to_del.append(i)
+            continue
+        # '-2' denotes previous revision
+        db.loc[i, "PREV_WPM"] = round(60 * sig[s][-2][1] / sig[s][-2][3], 0)
+        db.loc[i, "CUM_CNT_REVS"] = len(sig[s])
+        db.loc[i, "TIMEDELTA_LAST_REV"] = int(
+            (sig[s][-1][0] - sig[s][-2][0]).total_seconds() / 3600
+        )
+        db.loc[i, "TIMEDELTA_SINCE_CREATION"] = int(
+            (sig[s][-1][0] - sig[s][0][0]).total_seconds() / 3600
+        )
+        db.loc[i, "PREV_SCORE"] = int(100 * (sig[s][-2][2] / sig[s][-2][1]))
+
+        db.loc[i, "FIRST_SCORE"] = int(100 * sig[s][0][2] / sig[s][0][1])
+        db.loc[i, "DOW"] = sig[s][-1][0].weekday()
+        db.loc[i, "HOUR"] = sig[s][-1][0].hour
+        db.loc[i, "MONTH"] = sig[s][-1][0].month
+        db.loc[i, "STD_SCORE"] = statistics.pstdev(
+            [int(100 * x[2] / x[1]) for x in sig[s]]
+        )
+        db.loc[i, "TOTAL_TIME"] = sum(x[3] for x in sig[s])
+        db.loc[i, "TREND_SCORE"] = np.mean(
+            np.convolve(
+                [int(100 * x[2] / x[1]) for x in sig[s]],
+                np.ones(3) / 3,
+                mode="valid",
+            )
+        )
+        db.loc[i, "SCORE"] = int(100 * sig[s][-1][2] / sig[s][-1][1])
+
+    return db.drop(index=rows_to_del, axis=0)
+
+
+@pytest.mark.parametrize("fill_timespent", [False, True])
+def test_add_efc_metrics(fill_timespent):
+    db_conn.refresh()
+    db_conn.filter_for_efc_model(LANGUAGES)
+    assert (db_conn.db["SEC_SPENT"] == 0).any()
+    expected = reference_add_efc_metrics(db_conn.db.copy(), fill_timespent)
+    db_conn.add_efc_metrics(fill_timespent=fill_timespent)
+    res = db_conn.db
+    db_conn.refresh()
+
+    assert len(res) > 0
+    pd.testing.assert_index_equal(res.index, expected.index)
+    pd.testing.assert_index_equal(res.columns, expected.columns)
+    pd.testing.assert_series_equal(res.dtypes, expected.dtypes)
+    exact_cols = [c for c in res.columns if c not in APPROX_COLS]
+    pd.testing.assert_frame_equal(
+        res[exact_cols], expected[exact_cols], check_exact=True
+    )
+    for col in APPROX_COLS:
+        np.testing.assert_allclose(res[col], expected[col], rtol=0, atol=1e-9)
+
+
+def test_get_efc_sample():
+    """The online model learns from the record as it was trained on it"""
+    from EMO.models import RECORD_COLS
+
+    db_conn.refresh()
+    db_conn.filter_for_efc_model(LANGUAGES)
+    db_conn.add_efc_metrics(fill_timespent=True)
+    training = db_conn.db
+    db_conn.refresh()
+
+    last_rows = training.groupby("SIGNATURE", observed=True).tail(1)
+    missing_time = db_conn.db.loc[
+        db_conn.db["SEC_SPENT"].fillna(0) == 0, "SIGNATURE"
+    ].unique()
+    # Signatures with the time spent estimated are covered as well
+    assert last_rows["SIGNATURE"].isin(missing_time).any()
+    for i, row in last_rows.iterrows():
+        lng, record, score = db_conn.get_efc_sample(row["SIGNATURE"])
+        assert lng == row["LNG"]
+        assert record == row[RECORD_COLS].tolist()
+        assert score == row["SCORE"]
@@ -0,0 +1,157 @@
+"""
+Each storage engine must yield the same db as parsing db.csv, before and
+after records are added and signatures renamed
+"""
+
+import os
+from dataclasses import asdict
+from datetime import datetime
+from contextlib import contextmanager
+import pandas as pd
+import pytest
+import DBAC.db_queries
+from cfg import config
+from DBAC import db_conn
+from conftest import LANGUAGES
+
+DbOperator = type(db_conn)
+ENGINES = ("csv", "npy", "sqlite")
+NOW = datetime.now().replace(microsecond=0)
+REVISIONS = sorted(s for s in db_conn.get_unique_signatures() if s.startswith("REV_"))
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+class Engine:
+    """DbOperator working on its own copy of the workspace"""
+
+    def __init__(self, path: str, engine: str):
+        self.path = path
+        self.engine = engine
+        self.op = None
+
+    @contextmanager
+    def use(self):
+        cwd, engine = os.getcwd(), config["db"]["engine"]
+        os.chdir(self.path)
+        config["db"]["engine"] = self.engine
+        try:
+            yield self.op
+        finally:
+            os.chdir(cwd)
+            config["db"]["engine"] = engine
+
+    def open(self):
+        with self.use():
+            self.op = DbOperator()
+
+
+@pytest.fixture
+def engines(workspace_factory, monkeypatch) -> dict[str, Engine]:
+    monkeypatch.setattr(DBAC.db_queries, "datetime", FrozenDatetime)
+    res = dict()
+    for name in ENGINES:
+        res[name] = Engine(workspace_factory(name, name), name)
+        res[name].open()
+    # Cold starts from the db.npz and db.sqlite made by the first ones
+    for name in ("npy", "sqlite"):
+        with res[name].use():
+            assert os.path.exists(f"./src/res/db.{'npz' if name == 'npy' else name}")
+        res[name].open()
+    return res
+
+
+def normalized(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Categories left unused by renames and filters depend on how the db was
+    loaded, so only the used ones are compared, in order
+    """
+    df = df.reset_index(drop=True)
+    for col in df.columns[df.dtypes == "category"]:
+        used = df[col].cat.remove_unused_categories()
+        df[col] = used.cat.reorder_categories(sorted(used.cat.categories))
+    return df
+
+
+def get_state(engine: Engine, signatures: list[str]) -> dict:
+    """Everything that should not depend on the engine"""
+    with engine.use() as op:
+        op.refresh()
+        state = {
+            "db": normalized(op.db),
+            "efc_features": op.get_efc_features(LANGUAGES),
+        }
+        state["seconds_today"] = [op.get_seconds_spent_today(l) for l in LANGUAGES]
+        state["signatures"] = {
+            s: (
+                normalized(op.get_signature_rows(s)),
+                op.get_sum_repeated(s),
+                op.get_total_time_spent_for_signature(s),
+                op.get_last_score(s),
+                op.get_last_positives(s),
+                op.get_last_positives(s, req_not_first=True),
+                op.get_last_time_spent(s),
+                op.get_total_words(s),
+                op.get_max_positives_count(s),
+                op.get_first_datetime(s),
+                op.get_last_datetime(s),
+                op.get_count_of_records_missing_time(s),
+                op.get_signature_summary(s),
+            )
+            for s in signatures
+        }
+        op.filter_for_efc_model(LANGUAGES)
+        state["efc_model"] = normalized(op.db)
+        op.refresh()
+    return state
+
+
+def assert_states_equal(engines: dict[str, Engine], signatures: list[str]):
+    expected = get_state(engines["csv"], signatures)
+    assert len(expected["db"]) > 0 and len(expected["efc_features"]) > 0
+    for name in ENGINES[1:]:
+        state = get_state(engines[name], signatures)
+        pd.testing.assert_frame_equal(state["db"], expected["db"])
+        pd.testing.assert_frame_equal(state["efc_model"], expected["efc_model"])
+        assert state["seconds_today"] == expected["seconds_today"]
+        for s in signatures:
+            exp_rows, *exp_stats = expected["signatures"][s]
+            rows, *stats = state["signatures"][s]
+            pd.testing.assert_frame_equal(rows, exp_rows)
+            assert stats == exp_stats, s
+        assert state["efc_features"].keys() == expected["efc_features"].keys()
+        for s, f in state["efc_features"].items():
+            exp = asdict(expected["efc_features"][s])
+            res = asdict(f)
+            for k in ("ratio_mean", "ratio_m2"):
+                assert res.pop(k) == pytest.approx(exp.pop(k)), s
+            assert res == exp, s
+
+
+def test_load(engines):
+    assert_states_equal(engines, REVISIONS[:10])
+
+
+def test_create_record_and_rename(engines):
+    new_sig, merged_sig, target_sig, renamed_sig = REVISIONS[:4]
+    for engine in engines.values():
+        with engine.use() as op:
+            fd = next(fd for fd in op.files.values() if fd.signature == new_sig)
+            op.active_file = fd
+            op.create_record(50, 41, 200, is_first=0)
+            op.create_record(50, 44, 180, is_first=0)
+            op.rename_signature(merged_sig, target_sig)
+            op.rename_signature(renamed_sig, "REV_RENAMED")
+    signatures = [new_sig, target_sig, "REV_RENAMED"]
+    with engines["csv"].use() as op:
+        assert op.get_seconds_spent_today(op.active_file.lng) >= 380
+    assert_states_equal(engines, signatures)
+
+    # Same after a cold start
+    for engine in engines.values():
+        engine.open()
+    assert_states_equal(engines, signatures)